@@ -0,0 +1,121 @@
+""" Polynomial string hashing shared by the hash tables.
+
+Computes exactly the same bucket index as the per-character loop:
+
+    value = 0
+    a = 31415
+    for char in key:
+        value = (ord(char) + a * value) % table_size
+        a = a * base % (table_size - 1)
+
+The multiplier sequence only depends on the table size, so the loop is linear in the
+character codes: value = sum(ord(key[i]) * weight[i]) % table_size, where weight[i]
+is the product of the multipliers applied after character i. Weights are computed
+once per (table size, base, key length), and results are memoised per key, up to MEMO_LIMIT
+of them across every table.
+
+If NumPy is available, batches of keys with the same length are hashed together.
+"""
+from __future__ import annotations
+from typing import Iterable
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HASH_SEED = 31415
+
+# The most results memoised at once. The memo is emptied before it would grow past this.
+MEMO_LIMIT = 1 << 16
+
+_MAX_CODE_POINT = 0x110000
+
+_weights: dict[tuple[int, int, int], list[int]] = {}
+_np_weights: dict[tuple[int, int, int], object] = {}
+_memo: dict[tuple[int, int, str], int] = {}
+
+
+def _weights_for(table_size: int, base: int, length: int) -> list[int]:
+    """
+    Returns the weight of each character position for keys of this length.
+
+    :complexity: O(length) the first time, O(1) afterwards.
+    """
+    cache_key = (table_size, base, length)
+    if cache_key not in _weights:
+        multipliers = []
+        a = HASH_SEED
+        for _ in range(length):
+            multipliers.append(a)
+            a = a * base % (table_size - 1)
+        weights = [0] * length
+        product = 1
+        for i in range(length - 1, -1, -1):
+            weights[i] = product
+            product = product * multipliers[i] % table_size
+        _weights[cache_key] = weights
+    return _weights[cache_key]
+
+
+def _remember(table_size: int, base: int, key: str, value: int) -> None:
+    """
+    Memoises the hash of a key, emptying the memo first if it is full.
+
+    :complexity: O(1) amortised, as emptying a full memo takes MEMO_LIMIT insertions to fill again.
+    """
+    if len(_memo) >= MEMO_LIMIT:
+        _memo.clear()
+    _memo[(table_size, base, key)] = value
+
+
+def string_hash(key: str, table_size: int, base: int = 31) -> int:
+    """
+    Hash a single key into [0, table_size).
+
+    :complexity: O(len(key)) the first time a key is seen at this size, O(1) afterwards.
+    """
+    value = _memo.get((table_size, base, key))
+    if value is None:
+        weights = _weights_for(table_size, base, len(key))
+        value = sum(ord(char) * weight for char, weight in zip(key, weights)) % table_size
+        _remember(table_size, base, key, value)
+    return value
+
+
+def string_hash_many(keys: Iterable[str], table_size: int, base: int = 31) -> list[int]:
+    """
+    Hash a batch of keys into [0, table_size), in the same order as given.
+
+    :complexity: O(total length of unseen keys).
+    """
+    keys = list(keys)
+    if np is None:
+        return [string_hash(key, table_size, base) for key in keys]
+
+    # The batch's hashes are kept here, as the memo may be emptied partway through.
+    hashes: dict[str, int | None] = {}
+    # Group the unseen keys by length so each group is a single matrix product.
+    by_length: dict[int, list[str]] = {}
+    for key in keys:
+        if key not in hashes:
+            hashes[key] = _memo.get((table_size, base, key))
+            if hashes[key] is None:
+                by_length.setdefault(len(key), []).append(key)
+    for length, group in by_length.items():
+        if length == 0:
+            values = [0] * len(group)
+        elif length * _MAX_CODE_POINT * table_size >= 1 << 63:
+            # The weighted sum could overflow int64.
+            values = [string_hash(key, table_size, base) for key in group]
+        else:
+            cache_key = (table_size, base, length)
+            if cache_key not in _np_weights:
+                _np_weights[cache_key] = np.array(_weights_for(table_size, base, length), dtype=np.int64)
+            codes = np.frombuffer("".join(group).encode("utf-32-le"), dtype=np.uint32)
+            codes = codes.reshape(len(group), length).astype(np.int64)
+            values = ((codes @ _np_weights[cache_key]) % table_size).tolist()
+        for key, value in zip(group, values):
+            hashes[key] = value
+            _remember(table_size, base, key, value)
+    return [hashes[key] for key in keys]
@@ -0,0 +1,167 @@
+"""
+Compact binary trail files, loaded lazily through a memory map.
+
+A file is laid out as:
+
+    header      magic, version, reserved, node count, mountain count, root node
+    mountains   one fixed-width record per mountain: name offset and length, difficulty, length
+    nodes       one fixed-width record per node: kind, mountain, following, top, bottom
+    names       the UTF-8 mountain names, back to back
+
+Nodes are numbered as in FlatTrail, and unused node fields are -1. The reserved header
+field is 2 bytes of padding that keep the counts 4-byte aligned. It is written as 0 and
+ignored when loading.
+"""
+from __future__ import annotations
+import mmap, os, struct, weakref
+
+from flat_trail import FlatTrail, LazyTrail
+from mountain import Mountain
+from trail import Trail, TrailSeries, TrailSplit, TrailStore
+
+MAGIC = b"TRL\0"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHHIII")
+_MOUNTAIN = struct.Struct("<IIii")
+_NODE = struct.Struct("<biiii")
+
+# Every file still memory-mapped, so saving can release a map before replacing its file.
+_mapped_files: weakref.WeakSet[BinaryTrailFile] = weakref.WeakSet()
+
+def save_binary(trail: Trail, path: str) -> None:
+    """
+    Writes a trail to a binary trail file.
+
+    The file is written beside the target and then moved over it. A file can't be
+    replaced while it is mapped on every platform, so any map of the old file is first
+    copied into memory and closed, which keeps trails loaded from it readable.
+
+    :complexity: O(N + M), where N is the number of trail nodes and M the total length of the mountain names.
+    """
+    flat = FlatTrail(trail)
+    names = bytearray()
+    mountain_records = bytearray()
+    for mountain in flat.mountains:
+        name = mountain.name.encode("utf-8")
+        mountain_records += _MOUNTAIN.pack(len(names), len(name), mountain.difficulty_level, mountain.length)
+        names += name
+    node_records = bytearray()
+    for i in range(len(flat)):
+        node_records += _NODE.pack(flat.kinds[i], flat.mountain_of[i], flat.following[i], flat.top[i], flat.bottom[i])
+
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, 0, len(flat), len(flat.mountains), flat.root))
+        f.write(mountain_records)
+        f.write(node_records)
+        f.write(names)
+    target = os.path.abspath(path)
+    for source in list(_mapped_files):
+        if source.path == target:
+            source.release()
+    os.replace(temporary_path, path)
+
+def load_binary(path: str) -> Trail:
+    """
+    Opens a binary trail file, returning its root trail.
+
+    Only the header is read straight away. Each node is decoded from the memory map the first
+    time its store is accessed, and the map stays open while any of its trails are in use.
+
+    :raises ValueError: when the file is not a binary trail file of a supported version.
+    :complexity: O(1)
+    """
+    return BinaryTrailFile(path).trail(None)
+
+class BinaryTrailFile:
+    """
+    A memory-mapped binary trail file.
+
+    Mountains are decoded once each and then shared, as they were when saved.
+
+    Unless stated otherwise, all methods have O(1) complexity.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        :raises ValueError: when the file is not a binary trail file of a supported version, or is cut short.
+        """
+        self.path = os.path.abspath(path)
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # The map is only registered once the file is known to be valid, and closed otherwise.
+        try:
+            self._read_header(path)
+        except struct.error as e:
+            self.buffer.close()
+            raise ValueError(f"{path} is not a binary trail file") from e
+        except ValueError:
+            self.buffer.close()
+            raise
+        _mapped_files.add(self)
+        self.mountains: dict[int, Mountain] = {}
+
+    def _read_header(self, path: str) -> None:
+        magic, version, _, self.node_count, self.mountain_count, self.root = _HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a binary trail file")
+        if version != VERSION:
+            raise ValueError(f"{path} has unsupported version {version}")
+        self.mountains_offset = _HEADER.size
+        self.nodes_offset = self.mountains_offset + self.mountain_count * _MOUNTAIN.size
+        self.names_offset = self.nodes_offset + self.node_count * _NODE.size
+        if len(self.buffer) < self.names_offset or not 0 <= self.root < self.node_count:
+            raise ValueError(f"{path} is cut short")
+
+    def release(self) -> None:
+        """
+        Copies the file into memory and closes the map, so the file can be replaced.
+
+        :complexity: O(S), where S is the size of the file.
+        """
+        mapped = self.buffer
+        self.buffer = mapped[:]
+        mapped.close()
+        _mapped_files.discard(self)
+
+    def trail(self, node: int | None) -> Trail:
+        """Returns a lazy trail for a node, or for the root when node is None."""
+        return LazyTrail(self, self.root if node is None else node)
+
+    def mountain(self, index: int) -> Mountain:
+        """
+        Returns the mountain with this index.
+
+        :raises ValueError: when there is no mountain with this index, or its name is cut short.
+        :complexity: O(L) the first time, where L is the length of its name. O(1) afterwards.
+        """
+        if index not in self.mountains:
+            if not 0 <= index < self.mountain_count:
+                raise ValueError(f"{self.path} is corrupt")
+            name_offset, name_length, difficulty_level, length = _MOUNTAIN.unpack_from(
+                self.buffer, self.mountains_offset + index * _MOUNTAIN.size
+            )
+            start = self.names_offset + name_offset
+            if start + name_length > len(self.buffer):
+                raise ValueError(f"{self.path} is cut short")
+            name = self.buffer[start:start + name_length].decode("utf-8")
+            self.mountains[index] = Mountain(name, difficulty_level, length)
+        return self.mountains[index]
+
+    def store(self, node: int) -> TrailStore:
+        """
+        Decodes the store of a node, with lazy trails for its successors.
+
+        :raises ValueError: when there is no node with this index, or it is not a node the file can hold.
+        """
+        if not 0 <= node < self.node_count:
+            raise ValueError(f"{self.path} is corrupt")
+        kind, mountain, following, top, bottom = _NODE.unpack_from(self.buffer, self.nodes_offset + node * _NODE.size)
+        if kind == FlatTrail.EMPTY:
+            return None
+        elif kind == FlatTrail.SERIES:
+            return TrailSeries(self.mountain(mountain), self.trail(following))
+        elif kind == FlatTrail.SPLIT:
+            return TrailSplit(self.trail(top), self.trail(bottom), self.trail(following))
+        raise ValueError(f"{self.path} is corrupt")
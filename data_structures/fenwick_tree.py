@@ -0,0 +1,62 @@
+""" Fenwick Tree ADT
+
+Defines a Fenwick (binary indexed) tree over integer counts, supporting
+point updates and prefix sums in logarithmic time.
+"""
+from __future__ import annotations
+
+from data_structures.referential_array import ArrayR
+
+
+class FenwickTree:
+    """
+    Fenwick Tree.
+
+    Positions are 0-indexed externally, and 1-indexed internally.
+
+    Unless stated otherwise, all methods have O(1) complexity.
+    """
+
+    def __init__(self, counts: list[int]) -> None:
+        """
+        Initialise the tree with the given count at each position.
+
+        :complexity: O(N) where N is len(counts).
+        """
+        self.length = len(counts)
+        self.array: ArrayR[int] = ArrayR(self.length + 1)
+        self.array[0] = 0
+        for i in range(1, self.length + 1):
+            self.array[i] = counts[i - 1]
+        # Push each partial sum up to its parent, building in a single pass.
+        for i in range(1, self.length + 1):
+            parent = i + (i & -i)
+            if parent <= self.length:
+                self.array[parent] += self.array[i]
+
+    def __len__(self) -> int:
+        return self.length
+
+    def add(self, index: int, delta: int) -> None:
+        """
+        Add delta to the count at index.
+
+        :complexity: O(log(N)) where N is len(self).
+        """
+        i = index + 1
+        while i <= self.length:
+            self.array[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, index: int) -> int:
+        """
+        Returns the sum of all counts strictly before index.
+
+        :complexity: O(log(N)) where N is len(self).
+        """
+        total = 0
+        i = index
+        while i > 0:
+            total += self.array[i]
+            i -= i & -i
+        return total
@@ -7,8 +7,9 @@ __author__ = 'Jackson Goerner'
 __since__ = '07/02/2023'
 
 
-from typing import TypeVar, Generic
+from typing import TypeVar, Generic, Iterable, Iterator
 from data_structures.referential_array import ArrayR
+from algorithms.string_hash import string_hash, string_hash_many
 
 K = TypeVar('K')
 V = TypeVar('V')
@@ -48,15 +49,20 @@ class LinearProbeTable(Generic[K, V]):
         """
         Hash a key for insert/retrieve/update into the hashtable.
 
-        :complexity: O(len(key))
+        :complexity: O(len(key)) the first time a key is seen at this size, O(1) afterwards.
         """
+        return string_hash(key, self.table_size, self.HASH_BASE)
 
-        value = 0
-        a = 31415
-        for char in key:
-            value = (ord(char) + a * value) % self.table_size
-            a = a * self.HASH_BASE % (self.table_size - 1)
-        return value
+    def hash_many(self, keys: list[K]) -> list[int]:
+        """
+        Hash a batch of keys at once, in the same order.
+        Falls back to calling `hash` per key if it has been overwritten.
+
+        :complexity: O(total length of keys)
+        """
+        if "hash" in self.__dict__ or type(self).hash is not LinearProbeTable.hash:
+            return [self.hash(key) for key in keys]
+        return string_hash_many(keys, self.table_size, self.HASH_BASE)
 
     @property
     def table_size(self) -> int:
@@ -68,9 +74,10 @@ class LinearProbeTable(Generic[K, V]):
         """
         return self.count
 
-    def _linear_probe(self, key: K, is_insert: bool) -> int:
+    def _linear_probe(self, key: K, is_insert: bool, position: int|None=None) -> int:
         """
         Find the correct position for this key in the hash table using linear probing.
+        If the hash of the key is already known, it can be passed in as position.
         :complexity best: O(hash(key)) first position is empty
         :complexity worst: O(hash(key) + N*comp(K)) when we've searched the entire table
                         where N is the tablesize
@@ -78,7 +85,8 @@ class LinearProbeTable(Generic[K, V]):
         :raises FullError: When a table is full and cannot be inserted.
         """
         # Initial position
-        position = self.hash(key)
+        if position is None:
+            position = self.hash(key)
 
         for _ in range(self.table_size):
             if self.array[position] is None:
@@ -152,8 +160,13 @@ class LinearProbeTable(Generic[K, V]):
         :complexity: See linear probe.
         :raises FullError: when the table cannot be resized further.
         """
+        self._insert(key, data)
 
-        position = self._linear_probe(key, True)
+    def _insert(self, key: K, data: V, home: int|None=None) -> None:
+        """
+        Set an (key, value) pair, given the hash of the key if already known.
+        """
+        position = self._linear_probe(key, True, home)
 
         if self.array[position] is None:
             self.count += 1
@@ -191,25 +204,82 @@ class LinearProbeTable(Generic[K, V]):
     def is_full(self) -> bool:
         return self.count == self.table_size
 
+    @classmethod
+    def from_items(cls, items: Iterable[tuple[K, V]], expected: int|None=None, sizes=None) -> LinearProbeTable[K, V]:
+        """
+        Build a table from (key, value) pairs, sized once up front.
+
+        If expected is given, items are streamed; otherwise they are read into a list first
+        so they can be counted.
+
+        :complexity: O(N*hash(K)) when there is little probing, where N is the number of items.
+        """
+        table = cls(sizes)
+        if expected is None:
+            table.update(items)
+            return table
+        table.presize(expected)
+        for key, value in items:
+            table[key] = value
+        return table
+
+    def update(self, items: Iterable[tuple[K, V]]) -> None:
+        """
+        Set many (key, value) pairs, resizing at most once beforehand.
+        All keys are hashed together as one batch.
+
+        :complexity: O((N+M)*hash(K)) when there is little probing, where N is len(self)
+                    and M is the number of items.
+        """
+        items = list(items)
+        self.presize(len(self) + len(items))
+        size = self.table_size
+        homes = self.hash_many([key for key, _ in items])
+        for (key, value), home in zip(items, homes):
+            # Hashes are stale if the table could not be presized far enough.
+            self._insert(key, value, home if self.table_size == size else None)
+
+    def presize(self, expected: int) -> None:
+        """
+        Grow the table (never shrink) straight to the smallest size that can hold
+        `expected` entries without triggering a rehash.
+
+        :complexity: O(1) if no growth is needed, otherwise O(_resize).
+        """
+        size_index = self.size_index
+        while expected > self.TABLE_SIZES[size_index] / 2 and size_index + 1 < len(self.TABLE_SIZES):
+            size_index += 1
+        if size_index > self.size_index:
+            self._resize(size_index)
+
     def _rehash(self) -> None:
         """
         Need to resize table and reinsert all values
 
+        :complexity: See _resize.
+        """
+        if self.size_index + 1 >= len(self.TABLE_SIZES):
+            # Cannot be resized further.
+            return
+        self._resize(self.size_index + 1)
+
+    def _resize(self, size_index: int) -> None:
+        """
+        Reallocate the table at TABLE_SIZES[size_index] and reinsert all values.
+
         :complexity best: O(N*hash(K)) No probing.
         :complexity worst: O(N*hash(K) + N^2*comp(K)) Lots of probing.
         Where N is len(self)
         """
-        old_array = self.array
-        self.size_index += 1
-        if self.size_index >= len(self.TABLE_SIZES):
-            # Cannot be resized further.
-            return
+        items = [item for item in self.array if item is not None]
+        self.size_index = size_index
         self.array = ArrayR(self.TABLE_SIZES[self.size_index])
-        self.count = 0
-        for item in old_array:
-            if item is not None:
-                key, value = item
-                self[key] = value
+        homes = self.hash_many([key for key, _ in items])
+        # Every key is distinct, so each just takes the first empty slot.
+        for item, position in zip(items, homes):
+            while self.array[position] is not None:
+                position = (position + 1) % self.table_size
+            self.array[position] = item
 
     def __str__(self) -> str:
         """
@@ -223,3 +293,413 @@ class LinearProbeTable(Generic[K, V]):
                 (key, value) = item
                 result += "(" + str(key) + "," + str(value) + ")\n"
         return result
+
+
+class CompactLinearProbeTable(LinearProbeTable[K, V]):
+    """
+    Linear Probe Table storing keys, values and cached hashes in parallel arrays.
+
+    Each slot caches the hash (home position) of its key, so probing compares
+    integers before comparing keys, and compaction at the same size never rehashes
+    a key. Deleted slots are marked with a tombstone rather than reinserting the
+    rest of the cluster; tombstones are reused on insert and cleared by compaction.
+
+    Unless stated otherwise, all methods have O(1) complexity.
+    """
+    TOMBSTONE = object()
+
+    def __init__(self, sizes=None) -> None:
+        """
+        Initialise the Hash Table.
+        """
+        if sizes is not None:
+            self.TABLE_SIZES = sizes
+        self.size_index = 0
+        self._allocate(self.TABLE_SIZES[self.size_index])
+        self.count = 0
+        self.tombstones = 0
+
+    def _allocate(self, size: int) -> None:
+        self.keys_array: ArrayR[K] = ArrayR(size)
+        self.values_array: ArrayR[V] = ArrayR(size)
+        self.hashes_array: ArrayR[int] = ArrayR(size)
+
+    @property
+    def table_size(self) -> int:
+        return len(self.keys_array)
+
+    def _probe(self, key: K, is_insert: bool, home: int|None=None) -> tuple[int, int]:
+        """
+        Find the position for this key, and the key's hash.
+        If the hash of the key is already known, it can be passed in as home.
+
+        When inserting a key that isn't present, the first tombstone seen is reused.
+
+        :complexity best: O(hash(key)) first position is empty
+        :complexity worst: O(hash(key) + N*comp(K)) when we've searched the entire table
+                        where N is the tablesize
+        :raises KeyError: When the key is not in the table, but is_insert is False.
+        :raises FullError: When a table is full and cannot be inserted.
+        """
+        if home is None:
+            home = self.hash(key)
+        position = home
+        first_tombstone = None
+
+        for _ in range(self.table_size):
+            stored = self.keys_array[position]
+            if stored is None:
+                if is_insert:
+                    return (position if first_tombstone is None else first_tombstone), home
+                raise KeyError(key)
+            elif stored is self.TOMBSTONE:
+                if first_tombstone is None:
+                    first_tombstone = position
+            elif self.hashes_array[position] == home and stored == key:
+                return position, home
+            position = (position + 1) % self.table_size
+
+        if is_insert and first_tombstone is not None:
+            return first_tombstone, home
+        if is_insert:
+            raise FullError("Table is full!")
+        raise KeyError(key)
+
+    def _linear_probe(self, key: K, is_insert: bool, position: int|None=None) -> int:
+        """
+        Find the correct position for this key in the hash table using linear probing.
+
+        :complexity: See _probe.
+        :raises KeyError: When the key is not in the table, but is_insert is False.
+        :raises FullError: When a table is full and cannot be inserted.
+        """
+        return self._probe(key, is_insert, position)[0]
+
+    def keys(self) -> list[K]:
+        """
+        Returns all keys in the hash table.
+
+        :complexity: O(N) where N is self.table_size.
+        """
+        res = []
+        for x in range(self.table_size):
+            key = self.keys_array[x]
+            if key is not None and key is not self.TOMBSTONE:
+                res.append(key)
+        return res
+
+    def values(self) -> list[V]:
+        """
+        Returns all values in the hash table.
+
+        :complexity: O(N) where N is self.table_size.
+        """
+        res = []
+        for x in range(self.table_size):
+            key = self.keys_array[x]
+            if key is not None and key is not self.TOMBSTONE:
+                res.append(self.values_array[x])
+        return res
+
+    def __getitem__(self, key: K) -> V:
+        """
+        Get the value at a certain key
+
+        :complexity: See _probe.
+        :raises KeyError: when the key doesn't exist.
+        """
+        return self.values_array[self._probe(key, False)[0]]
+
+    def __setitem__(self, key: K, data: V) -> None:
+        """
+        Set an (key, value) pair in our hash table.
+
+        :complexity: See _probe.
+        :raises FullError: when the table cannot be resized further.
+        """
+        self._insert(key, data)
+
+    def _insert(self, key: K, data: V, home: int|None=None) -> None:
+        """
+        Set an (key, value) pair, given the hash of the key if already known.
+        """
+        position, home = self._probe(key, True, home)
+
+        stored = self.keys_array[position]
+        if stored is None or stored is self.TOMBSTONE:
+            self.count += 1
+            if stored is self.TOMBSTONE:
+                self.tombstones -= 1
+            self.keys_array[position] = key
+            self.hashes_array[position] = home
+        self.values_array[position] = data
+
+        if len(self) > self.table_size / 2:
+            self._rehash()
+        elif len(self) + self.tombstones > self.table_size / 2:
+            self._compact()
+
+    def __delitem__(self, key: K) -> None:
+        """
+        Deletes a (key, value) pair in our hash table, leaving a tombstone.
+
+        :complexity: See _probe.
+        :raises KeyError: when the key doesn't exist.
+        """
+        position = self._probe(key, False)[0]
+        self.keys_array[position] = self.TOMBSTONE
+        self.values_array[position] = None
+        self.hashes_array[position] = None
+        self.count -= 1
+        self.tombstones += 1
+
+    def is_full(self) -> bool:
+        return self.count + self.tombstones == self.table_size
+
+    def _rehash(self) -> None:
+        """
+        Need to resize table and reinsert all values.
+        If the table cannot grow any further, tombstones are compacted instead.
+
+        :complexity: See _resize.
+        """
+        if self.size_index + 1 >= len(self.TABLE_SIZES):
+            # Cannot be resized further.
+            self._compact()
+            return
+        self._resize(self.size_index + 1)
+
+    def _resize(self, size_index: int) -> None:
+        """
+        Reallocate the table at TABLE_SIZES[size_index] and reinsert all values.
+
+        :complexity best: O(N*hash(K)) No probing.
+        :complexity worst: O(N*hash(K) + N^2) Lots of probing.
+        Where N is len(self)
+        """
+        self.size_index = size_index
+        self._reinsert(self.TABLE_SIZES[self.size_index], rehash=True)
+
+    def _compact(self) -> None:
+        """
+        Rebuild the table at its current size, dropping all tombstones.
+        Cached hashes are still valid at the same size, so no key is rehashed.
+
+        :complexity best: O(N) No probing.
+        :complexity worst: O(N^2) Lots of probing.
+        Where N is the tablesize
+        """
+        self._reinsert(self.table_size, rehash=False)
+
+    def _reinsert(self, size: int, rehash: bool) -> None:
+        """
+        Place every live entry into freshly allocated arrays of the given size.
+        No keys are compared, as every key in the old table is distinct.
+        """
+        old_keys, old_values, old_hashes = self.keys_array, self.values_array, self.hashes_array
+        live = [i for i in range(len(old_keys)) if old_keys[i] is not None and old_keys[i] is not self.TOMBSTONE]
+        self._allocate(size)
+        self.tombstones = 0
+        if rehash:
+            homes = self.hash_many([old_keys[i] for i in live])
+        else:
+            homes = [old_hashes[i] for i in live]
+        for i, home in zip(live, homes):
+            key = old_keys[i]
+            position = home
+            while self.keys_array[position] is not None:
+                position = (position + 1) % size
+            self.keys_array[position] = key
+            self.values_array[position] = old_values[i]
+            self.hashes_array[position] = home
+
+    def __str__(self) -> str:
+        """
+        Returns all they key/value pairs in our hash table (no particular
+        order).
+        :complexity: O(N * (str(key) + str(value))) where N is the table size
+        """
+        result = ""
+        for x in range(self.table_size):
+            key = self.keys_array[x]
+            if key is not None and key is not self.TOMBSTONE:
+                result += "(" + str(key) + "," + str(self.values_array[x]) + ")\n"
+        return result
+
+
+class IncrementalLinearProbeTable(LinearProbeTable[K, V]):
+    """
+    Linear Probe Table which resizes incrementally.
+
+    On a rehash the old array is kept alongside the new one, and every later probe
+    migrates up to MIGRATE_STEP slots of it into the new array. A key that is probed
+    before its slot has been migrated is moved over straight away, so positions
+    returned by `_linear_probe` always refer to `self.array`.
+
+    Unless stated otherwise, all methods have O(1) complexity.
+    """
+    MIGRATE_STEP = 64
+
+    # Left in the old array once an entry has moved, so its probe chains stay intact.
+    MOVED = (object(), None)
+
+    def __init__(self, sizes=None) -> None:
+        """
+        Initialise the Hash Table.
+        """
+        super().__init__(sizes)
+        self.old_array: ArrayR[tuple[K, V]]|None = None
+        self.migrate_position = 0
+
+    def is_resizing(self) -> bool:
+        return self.old_array is not None
+
+    def _linear_probe(self, key: K, is_insert: bool, position: int|None=None) -> int:
+        """
+        Find the correct position for this key in the hash table using linear probing,
+        after advancing any resize in progress.
+
+        :complexity best: O(hash(key)) first position is empty and no resize is in progress.
+        :complexity worst: O(MIGRATE_STEP*hash(K) + hash(key) + N*comp(K)) where N is the tablesize
+        :raises KeyError: When the key is not in the table, but is_insert is False.
+        :raises FullError: When a table is full and cannot be inserted.
+        """
+        if self.old_array is not None:
+            self._migrate(self.MIGRATE_STEP)
+        if self.old_array is not None:
+            self._move_from_old(key)
+        return super()._linear_probe(key, is_insert, position)
+
+    def _move_from_old(self, key: K) -> None:
+        """
+        If key has not been migrated yet, move it into the new array.
+        The old array is swapped in while probing so `hash` sees the old table size.
+        """
+        new_array = self.array
+        self.array = self.old_array
+        try:
+            old_position = LinearProbeTable._linear_probe(self, key, False)
+        except KeyError:
+            return
+        finally:
+            self.array = new_array
+        item = self.old_array[old_position]
+        self.old_array[old_position] = self.MOVED
+        self._place(item)
+
+    def _place(self, item: tuple[K, V]) -> None:
+        """
+        Place an entry whose key is not yet in the new array.
+        """
+        position = self.hash(item[0])
+        while self.array[position] is not None:
+            position = (position + 1) % self.table_size
+        self.array[position] = item
+
+    def _migrate(self, steps: int) -> None:
+        """
+        Move the next `steps` slots of the old array into the new array.
+
+        :complexity: O(steps*hash(K)) with little probing.
+        """
+        end = min(self.migrate_position + steps, len(self.old_array))
+        for i in range(self.migrate_position, end):
+            item = self.old_array[i]
+            if item is not None and item is not self.MOVED:
+                self.old_array[i] = self.MOVED
+                self._place(item)
+        self.migrate_position = end
+        if end == len(self.old_array):
+            self.old_array = None
+
+    def iter_items(self) -> Iterator[tuple[K, V]]:
+        """
+        Yields every (key, value) pair, including those not migrated yet.
+
+        :complexity: O(N) where N is self.table_size plus the old table size.
+        """
+        for x in range(self.table_size):
+            if self.array[x] is not None:
+                yield self.array[x]
+        if self.old_array is not None:
+            for item in self.old_array:
+                if item is not None and item is not self.MOVED:
+                    yield item
+
+    def keys(self) -> list[K]:
+        """
+        Returns all keys in the hash table.
+
+        :complexity: See iter_items.
+        """
+        return [key for key, _ in self.iter_items()]
+
+    def values(self) -> list[V]:
+        """
+        Returns all values in the hash table.
+
+        :complexity: See iter_items.
+        """
+        return [value for _, value in self.iter_items()]
+
+    def __delitem__(self, key: K) -> None:
+        """
+        Deletes a (key, value) pair in our hash table.
+
+        :complexity best: O(hash(key)) deleting item is not probed and in correct spot.
+        :complexity worst: O(N*hash(key)+N^2*comp(K)) deleting item is midway through large chain.
+        :raises KeyError: when the key doesn't exist.
+        """
+        position = self._linear_probe(key, False)
+        # Remove the element
+        self.array[position] = None
+        self.count -= 1
+        # Start moving over the cluster. Nothing in it is in the old array.
+        position = (position + 1) % self.table_size
+        while self.array[position] is not None:
+            item = self.array[position]
+            self.array[position] = None
+            self._place(item)
+            position = (position + 1) % self.table_size
+
+    def _rehash(self) -> None:
+        """
+        Start resizing the table. Only the first MIGRATE_STEP slots move now,
+        the rest move during later probes.
+        Any resize still in progress is finished first.
+
+        :complexity: O(MIGRATE_STEP*hash(K) + N) with little probing, where N is the new table size,
+        or O(_migrate) of the whole old table when a resize was still in progress.
+        """
+        if self.old_array is not None:
+            self._migrate(len(self.old_array))
+        if self.size_index + 1 >= len(self.TABLE_SIZES):
+            # Cannot be resized further.
+            return
+        self.size_index += 1
+        self.old_array = self.array
+        self.array = ArrayR(self.TABLE_SIZES[self.size_index])
+        self.migrate_position = 0
+        self._migrate(self.MIGRATE_STEP)
+
+    def _resize(self, size_index: int) -> None:
+        """
+        Reallocate the table at TABLE_SIZES[size_index] in one pass,
+        finishing any resize in progress first.
+
+        :complexity: See LinearProbeTable._resize.
+        """
+        if self.old_array is not None:
+            self._migrate(len(self.old_array))
+        super()._resize(size_index)
+
+    def __str__(self) -> str:
+        """
+        Returns all they key/value pairs in our hash table (no particular
+        order).
+        :complexity: O(N * (str(key) + str(value))) where N is the table size
+        """
+        result = ""
+        for key, value in self.iter_items():
+            result += "(" + str(key) + "," + str(value) + ")\n"
+        return result
@@ -0,0 +1,97 @@
+""" Sparse Array ADT
+
+Defines a fixed-length array of references that only stores its occupied
+slots, promoting itself to a full ArrayR once it becomes dense enough.
+"""
+from __future__ import annotations
+
+from typing import TypeVar, Generic
+
+from data_structures.referential_array import ArrayR
+
+T = TypeVar('T')
+
+
+class SparseArrayR(Generic[T]):
+    """
+    Sparse Array.
+
+    While sparse, bit i of `bitmap` is set when slot i is occupied, and `items`
+    holds the occupied slots' values in slot order, so slot i lives at
+    items[number of set bits below i]. Once more than PROMOTE_AT slots are
+    occupied, the values move into a full ArrayR held in `full`.
+
+    Unless stated otherwise, all methods have O(1) complexity.
+    """
+    __slots__ = ("length", "bitmap", "items", "full")
+
+    PROMOTE_AT = 8
+
+    def __init__(self, length: int) -> None:
+        """
+        :pre: length > 0
+        """
+        if length <= 0:
+            raise ValueError("Array length should be larger than 0.")
+        self.length = length
+        self.bitmap = 0
+        self.items: list[T] = []
+        self.full: ArrayR[T] | None = None
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, index: int) -> T:
+        """
+        Returns the object in position index, or None when it is empty.
+
+        :pre: index in between 0 and length
+        """
+        if self.full is not None:
+            return self.full[index]
+        bit = 1 << index
+        if not self.bitmap & bit:
+            return None
+        return self.items[bin(self.bitmap & (bit - 1)).count("1")]
+
+    def __setitem__(self, index: int, value: T) -> None:
+        """
+        Sets the object in position index to value. Setting None empties the slot.
+
+        :complexity: O(P) while sparse, where P is PROMOTE_AT. O(length) when promoting.
+        :pre: index in between 0 and length
+        """
+        if self.full is not None:
+            self.full[index] = value
+            return
+        if not 0 <= index < self.length:
+            raise IndexError(index)
+        bit = 1 << index
+        rank = bin(self.bitmap & (bit - 1)).count("1")
+        if self.bitmap & bit:
+            if value is None:
+                self.bitmap &= ~bit
+                self.items.pop(rank)
+            else:
+                self.items[rank] = value
+        elif value is not None:
+            self.bitmap |= bit
+            self.items.insert(rank, value)
+            if len(self.items) > self.PROMOTE_AT:
+                self._promote()
+
+    def _promote(self) -> None:
+        """
+        Move every value into a full ArrayR.
+
+        :complexity: O(length)
+        """
+        full = ArrayR(self.length)
+        rank = 0
+        for index in range(self.length):
+            if self.bitmap & (1 << index):
+                full[index] = self.items[rank]
+                rank += 1
+        self.full = full
+        self.bitmap = 0
+        self.items = []
@@ -1,14 +1,52 @@
 from __future__ import annotations
 
-from typing import Generic, TypeVar, Iterator
-from data_structures.hash_table import LinearProbeTable, FullError
+from typing import Generic, TypeVar, Iterator, Iterable
+from data_structures.hash_table import LinearProbeTable, IncrementalLinearProbeTable, FullError
 from data_structures.referential_array import ArrayR
 from data_structures.linked_stack import LinkedStack
+from algorithms.string_hash import string_hash, string_hash_many
 
 K1 = TypeVar('K1')
 K2 = TypeVar('K2')
 V = TypeVar('V')
 
+class TopLevelTable(IncrementalLinearProbeTable[K1, "InternalTable[K2, V]"]):
+    """
+    Top-level table of a DoubleKeyTable, hashing keys with the owner's `hash1`.
+    """
+    def __init__(self, owner: DoubleKeyTable[K1, K2, V], sizes=None) -> None:
+        super().__init__(sizes)
+        self.owner = owner
+
+    def hash(self, key: K1) -> int:
+        return self.owner.hash1(key)
+
+    def hash_many(self, keys: list[K1]) -> list[int]:
+        if "hash1" in self.owner.__dict__ or type(self.owner).hash1 is not DoubleKeyTable.hash1:
+            return [self.hash(key) for key in keys]
+        return string_hash_many(keys, self.table_size, self.owner.HASH_BASE)
+
+
+class InternalTable(IncrementalLinearProbeTable[K2, V]):
+    """
+    Internal table of a DoubleKeyTable, hashing keys with the owner's `hash2`.
+
+    Holding the owner rather than a closure per table, and starting from the owner's
+    small INTERNAL_TABLE_SIZES, keeps wide tables with many top-level keys cheap to build.
+    """
+    def __init__(self, owner: DoubleKeyTable[K1, K2, V], sizes=None) -> None:
+        super().__init__(sizes)
+        self.owner = owner
+
+    def hash(self, key: K2) -> int:
+        return self.owner.hash2(key, self)
+
+    def hash_many(self, keys: list[K2]) -> list[int]:
+        if "hash2" in self.owner.__dict__ or type(self.owner).hash2 is not DoubleKeyTable.hash2:
+            return [self.hash(key) for key in keys]
+        return string_hash_many(keys, self.table_size, self.owner.HASH_BASE)
+
+
 class DoubleKeyTable(Generic[K1, K2, V]):
     """
     Double Hash Table.
@@ -26,47 +64,36 @@ class DoubleKeyTable(Generic[K1, K2, V]):
     # No test case should exceed 1 million entries.
     TABLE_SIZES = [5, 13, 29, 53, 97, 193, 389, 769, 1543, 3079, 6151, 12289, 24593, 49157, 98317, 196613, 393241, 786433, 1572869]
 
+    # Most internal tables hold few keys, so they start smaller and grow as they fill.
+    INTERNAL_TABLE_SIZES = [3] + TABLE_SIZES
+
     HASH_BASE = 31
 
     def __init__(self, sizes:list|None=None, internal_sizes:list|None=None) -> None:
 
         if sizes is None:
-            self.top_level_hash_table = LinearProbeTable(self.TABLE_SIZES)
+            self.top_level_hash_table = TopLevelTable(self, self.TABLE_SIZES)
         else:
-            self.top_level_hash_table = LinearProbeTable(sizes)
+            self.top_level_hash_table = TopLevelTable(self, sizes)
 
-        self.top_level_hash_table.hash = lambda k: self.hash1(k)
-        
         if internal_sizes is not None:
-            self.TABLE_SIZES = internal_sizes
+            self.INTERNAL_TABLE_SIZES = internal_sizes
 
     def hash1(self, key: K1) -> int:
         """
         Hash the 1st key for insert/retrieve/update into the hashtable.
 
-        :complexity: O(len(key))
+        :complexity: O(len(key)) the first time a key is seen at this size, O(1) afterwards.
         """
+        return string_hash(key, self.table_size, self.HASH_BASE)
 
-        value = 0
-        a = 31415
-        for char in key:
-            value = (ord(char) + a * value) % self.table_size
-            a = a * self.HASH_BASE % (self.table_size - 1)
-        return value
-
-    def hash2(self, key: K2, sub_table: LinearProbeTable[K2, V]) -> int:
+    def hash2(self, key: K2, sub_table: InternalTable[K2, V]) -> int:
         """
         Hash the 2nd key for insert/retrieve/update into the hashtable.
 
-        :complexity: O(len(key))
+        :complexity: O(len(key)) the first time a key is seen at this size, O(1) afterwards.
         """
-
-        value = 0
-        a = 31415
-        for char in key:
-            value = (ord(char) + a * value) % sub_table.table_size
-            a = a * self.HASH_BASE % (sub_table.table_size - 1)
-        return value
+        return string_hash(key, sub_table.table_size, self.HASH_BASE)
 
     def _linear_probe(self, key1: K1, key2: K2, is_insert: bool) -> tuple[int, int]:
         """
@@ -81,8 +108,7 @@ class DoubleKeyTable(Generic[K1, K2, V]):
         """
         position1 = self.top_level_hash_table._linear_probe(key1, is_insert)
         if is_insert is True and self.top_level_hash_table.array[position1] is None:
-            internal_table = LinearProbeTable(self.TABLE_SIZES)
-            internal_table.hash = lambda k: self.hash2(k, internal_table)
+            internal_table = InternalTable(self, self.INTERNAL_TABLE_SIZES)
             self.top_level_hash_table.array[position1] = (key1, internal_table)
             self.top_level_hash_table.count += 1
 
@@ -102,18 +128,12 @@ class DoubleKeyTable(Generic[K1, K2, V]):
         complexity worst case: O(N + __getitem__) where N is internal table size.
         """
         if key is None:
-            for i in range(self.top_level_hash_table.table_size):
-                if self.top_level_hash_table.array[i] is None:
-                    continue
-                else:
-                    yield self.top_level_hash_table.array[i][0]
+            for key1, _ in self.top_level_hash_table.iter_items():
+                yield key1
         else:
             internal_table = self.top_level_hash_table.__getitem__(key)
-            for i in range(internal_table.table_size):
-                if internal_table.array[i] is None:
-                    continue
-                else:
-                    yield internal_table.array[i][0]
+            for key2, _ in internal_table.iter_items():
+                yield key2
 
     def keys(self, key:K1|None=None) -> list[K1|K2]:
         """
@@ -121,14 +141,13 @@ class DoubleKeyTable(Generic[K1, K2, V]):
         key = x: returns all bottom-level keys for top-level key x.
 
         :complexity best case: O(N) where N is self.top_level_hash_table.table_sizes.
-        :complexity worst case: O(hash(key) + __getitem__ + M) where M is self.internal_sizes.
+        :complexity worst case: O(hash(key) + __getitem__ + M) where M is the internal table size.
         """
         if key is None:
             return self.top_level_hash_table.keys()
 
         else:
             internal_table = self.top_level_hash_table.__getitem__(key)
-            internal_table.hash = lambda k: self.hash2(k, internal_table)
             return internal_table.keys()
 
     def iter_values(self, key:K1|None=None) -> Iterator[V]:
@@ -143,21 +162,13 @@ class DoubleKeyTable(Generic[K1, K2, V]):
         complexity worst case: O(N + __getitem__) where N is internal table size.
         """
         if key is None:
-            for i in range(self.top_level_hash_table.table_size):
-                cell = self.top_level_hash_table.array[i]
-                if cell is None:
-                    continue
-                else:
-                    internal_table = cell[1]
-                    for value in internal_table.values():
-                        yield value
+            for _, internal_table in self.top_level_hash_table.iter_items():
+                for _, value in internal_table.iter_items():
+                    yield value
         else:
             internal_table = self.top_level_hash_table.__getitem__(key)
-            for i in range(internal_table.table_size):
-                if internal_table.array[i] is None:
-                    continue
-                else:
-                    yield internal_table.array[i][1]
+            for _, value in internal_table.iter_items():
+                yield value
 
     def values(self, key:K1|None=None) -> list[V]:
         """
@@ -174,7 +185,6 @@ class DoubleKeyTable(Generic[K1, K2, V]):
 
         else:
             internal_table = self.top_level_hash_table.__getitem__(key)
-            internal_table.hash = lambda k: self.hash2(k, internal_table)
             return internal_table.values()
         
     def __contains__(self, key: tuple[K1, K2]) -> bool:
@@ -206,27 +216,49 @@ class DoubleKeyTable(Generic[K1, K2, V]):
         """
         Set an (key, value) pair in our hash table.
 
-        complexity best case: O(1), where its the first item.
-        complexity worst case: O(N*hash(K1) + N*hash(K2) + N^2*comp(K1) N^2*comp(K2)), where it needs to rehash the top-level 
-                                and internal tables and lots of probing. N is the table size.
+        Resizes are incremental, so no single insert migrates more than
+        MIGRATE_STEP slots of each table it touches.
+
+        complexity best case: O(hash(K1) + hash(K2)), where there is no probing.
+        complexity worst case: O(_linear_probe + _rehash), where both tables start resizing.
         """
         position = self._linear_probe(key[0], key[1], True)
 
-        if self.top_level_hash_table.array[position[0]] is None:
-            self.top_level_hash_table.count += 1
-
         internal_table = self.top_level_hash_table.array[position[0]][1]
 
-        if len(self.top_level_hash_table) > self.top_level_hash_table.table_size / 2:
-            self.top_level_hash_table._rehash()
-
         if internal_table.array[position[1]] is None:
             internal_table.count += 1
 
+        internal_table.array[position[1]] = (key[1], data)
+
         if len(internal_table) > internal_table.table_size / 2:
             internal_table._rehash()
 
-        internal_table.array[position[1]] = (key[1], data)
+        if len(self.top_level_hash_table) > self.top_level_hash_table.table_size / 2:
+            self._rehash()
+
+    def bulk_set(self, items: Iterable[tuple[tuple[K1, K2], V]]) -> None:
+        """
+        Set many ((key1, key2), value) pairs.
+
+        Pairs are grouped by key1 so the top-level table and each internal table
+        are resized at most once, straight to their final size.
+
+        complexity best case: O(N*(hash(K1) + hash(K2))), where N is the number of items and there is little probing.
+        complexity worst case: O(N*(hash(K1) + hash(K2)) + N^2*(comp(K1) + comp(K2))), with lots of probing.
+        """
+        groups: dict[K1, list[tuple[K2, V]]] = {}
+        for (key1, key2), data in items:
+            if key1 not in groups:
+                groups[key1] = []
+            groups[key1].append((key2, data))
+
+        self.top_level_hash_table.presize(len(self.top_level_hash_table) + len(groups))
+        for key1, pairs in groups.items():
+            # Probing with insert creates the internal table if needed.
+            position1, _ = self._linear_probe(key1, pairs[0][0], True)
+            internal_table = self.top_level_hash_table.array[position1][1]
+            internal_table.update(pairs)
 
     def __delitem__(self, key: tuple[K1, K2]) -> None:
         """
@@ -245,13 +277,12 @@ class DoubleKeyTable(Generic[K1, K2, V]):
             
     def _rehash(self) -> None:
         """
-        Need to resize table and reinsert all values
+        Start resizing the top-level table. Its slots migrate to the new array
+        a few at a time, during later operations on this table.
 
-        :complexity best: O(N*hash(K)) No probing.
-        :complexity worst: O(N*hash(K) + N^2*comp(K)) Lots of probing.
-        Where N is len(self)
+        :complexity: See IncrementalLinearProbeTable._rehash.
         """
-        raise NotImplementedError()
+        self.top_level_hash_table._rehash()
 
     @property
     def table_size(self) -> int:
@@ -7,9 +7,10 @@ A bit of a mess, you 100% don't need to look at this for your assignment!
 from __future__ import annotations
 from dataclasses import dataclass, field
 from mountain import Mountain
-from utils import av, bezier
+from utils import av, bezier_polyline
 from constants import DrawMode
-from trail import Trail, TrailSeries, TrailSplit
+from data_structures.linked_stack import LinkedStack
+from trail import Trail, TrailSeries, TrailSplit, TrailStore
 
 @dataclass
 class Box:
@@ -25,8 +26,8 @@ class Box:
                 return True
         return False
 
-# These inheritance models are just for hinting that we are injection
-# the box attributes into the existing trail classes.
+# These inheritance models are just for hinting at the boxes TrailDraw
+# keeps for each of the existing trail classes.
 
 @dataclass
 class TrailSplitBox(TrailSplit):
@@ -46,6 +47,61 @@ class TrailBox(Trail):
 
     trail_box: Box = field(default_factory=Box)
 
+class TrailScene:
+    """
+    Everything one layout of a trail draws, recorded so it can be drawn again every frame.
+
+    The arcade objects are built on the first draw: one shape list for every line and
+    curve, one sprite list for every mountain, and a text object for every label.
+    arcade 2.6's Text can't be added to a batch, so each label is still its own draw,
+    but its layout is only computed once.
+    """
+
+    def __init__(self) -> None:
+        self.lines: list[tuple[float, float, float, float]] = []
+        self.strips: list[list[tuple[float, float]]] = []
+        self.mountains: list[tuple[float, float, float, Mountain]] = []
+        self.shapes = None
+        self.sprites = None
+        self.labels = None
+
+    def build(self, draw: TrailDraw) -> None:
+        import arcade
+        self.shapes = arcade.ShapeElementList()
+        for sx, sy, ex, ey in self.lines:
+            self.shapes.append(arcade.create_line(sx, sy, ex, ey, (0, 0, 0), 1))
+        for strip in self.strips:
+            self.shapes.append(arcade.create_line_strip(strip, (0, 0, 0), 1))
+        self.sprites = arcade.SpriteList()
+        self.labels = []
+        for x, y, scale, obj in self.mountains:
+            mountain = arcade.Sprite("img/hike.png", scale=draw.MIN_MOUNTAIN_WIDTH/512 * scale)
+            mountain.center_x = x
+            mountain.center_y = y
+            self.sprites.append(mountain)
+            for text, dx, colour in [
+                (obj.difficulty_level, -1, (237, 17, 68)),
+                (obj.length, 1, (17, 127, 245)),
+            ]:
+                self.labels.append(arcade.Text(
+                    str(text),
+                    x + dx * draw.MIN_MOUNTAIN_WIDTH * scale / 2,
+                    y + draw.MOUNTAIN_HEIGHT * scale / 2,
+                    colour,
+                    font_size=24,
+                    font_name=("Montserrat", "calibri", "arial"),
+                    anchor_x="center",
+                    anchor_y="center",
+                ))
+
+    def draw(self, draw: TrailDraw) -> None:
+        if self.shapes is None:
+            self.build(draw)
+        self.shapes.draw()
+        self.sprites.draw()
+        for label in self.labels:
+            label.draw()
+
 class TrailDraw:
 
     ### Visual constants
@@ -66,39 +122,116 @@ class TrailDraw:
 
     def __init__(self, trail: TrailBox) -> None:
         self.trail = trail
+        # Layout sizes and click boxes, kept here rather than on the trail nodes, keyed by
+        # the id of the node they belong to. Each entry holds its node, so the id can't be reused.
+        self.sizes: dict[int, tuple[Trail, tuple[int, int]]] = {}
+        self.boxes: dict[int, tuple[TrailStore|Trail, dict[str, Box]]] = {}
+        # The scene recorded by the last layout, and the (trail, box) it was laid out for.
+        self.scene: TrailScene|None = None
+        self.scene_key = None
 
     # VISUAL CALCULATIONS
 
     def required_height(self, cur_trail: TrailBox|None=None) -> int:
-        if cur_trail is None:
-            cur_trail = self.trail.store
-        else:
-            cur_trail = cur_trail.store
-        if cur_trail is None:
-            return self.EMPTY_HEIGHT
-        elif isinstance(cur_trail, TrailSeries):
-            return max(self.MOUNTAIN_HEIGHT, self.required_height(cur_trail.following))
-        else:
-            return max(
-                self.required_height(cur_trail.top) + self.BRANCH_SEPARATION + self.required_height(cur_trail.bottom),
-                self.required_height(cur_trail.following)
-            )
+        return self.layout(cur_trail)[1]
 
     def required_width(self, cur_trail: TrailBox|None=None) -> int:
-        if cur_trail is None:
-            cur_trail = self.trail.store
-        else:
-            cur_trail = cur_trail.store
-        if cur_trail is None:
-            return 0
-        elif isinstance(cur_trail, TrailSeries):
-            return self.TOTAL_MOUNTAIN_WIDTH + self.required_width(cur_trail.following)
-        else:
-            return 2 * self.BRANCH_WIDTH + max(
-                self.required_width(cur_trail.top),
-                self.required_width(cur_trail.bottom),
-                self.MIN_BRANCH_CONTENT_WIDTH,
-            ) + self.required_width(cur_trail.following)
+        return self.layout(cur_trail)[0]
+
+    def layout(self, cur_trail: TrailBox|None=None) -> tuple[int, int]:
+        """
+        Returns the (width, height) a trail needs, caching it for every trail below in `sizes`.
+
+        Sizes are computed once bottom-up, and reused until invalidate_layout clears them.
+
+        :complexity: O(N) for the uncached trails, where N is their number. O(1) when cached.
+        """
+        root = self.trail if cur_trail is None else cur_trail
+        stack_trail = LinkedStack()
+        stack_trail.push((root, False))
+        while not stack_trail.is_empty():
+            ref_trail, children_done = stack_trail.pop()
+            if id(ref_trail) in self.sizes:
+                continue
+            cur_trail = ref_trail.store
+            if cur_trail is None:
+                self.sizes[id(ref_trail)] = (ref_trail, (0, self.EMPTY_HEIGHT))
+            elif not children_done:
+                stack_trail.push((ref_trail, True))
+                stack_trail.push((cur_trail.following, False))
+                if isinstance(cur_trail, TrailSplit):
+                    stack_trail.push((cur_trail.bottom, False))
+                    stack_trail.push((cur_trail.top, False))
+            elif isinstance(cur_trail, TrailSeries):
+                following_width, following_height = self.sizes[id(cur_trail.following)][1]
+                self.sizes[id(ref_trail)] = (ref_trail, (
+                    self.TOTAL_MOUNTAIN_WIDTH + following_width,
+                    max(self.MOUNTAIN_HEIGHT, following_height),
+                ))
+            else:
+                top_width, top_height = self.sizes[id(cur_trail.top)][1]
+                bottom_width, bottom_height = self.sizes[id(cur_trail.bottom)][1]
+                following_width, following_height = self.sizes[id(cur_trail.following)][1]
+                self.sizes[id(ref_trail)] = (ref_trail, (
+                    2 * self.BRANCH_WIDTH + max(top_width, bottom_width, self.MIN_BRANCH_CONTENT_WIDTH) + following_width,
+                    max(top_height + self.BRANCH_SEPARATION + bottom_height, following_height),
+                ))
+        return self.sizes[id(root)][1]
+
+    def invalidate_layout(self, path: tuple[str, ...]) -> None:
+        """
+        Clears the cached sizes of the trails from the root along a path of
+        "top", "bottom" and "following" steps, which are the only ones an edit there changes.
+
+        :complexity: O(P), where P is the length of the path.
+        """
+        self.invalidate_scene()
+        ref_trail = self.trail
+        self.sizes.pop(id(ref_trail), None)
+        for step in path:
+            ref_trail = getattr(ref_trail.store, step)
+            self.sizes.pop(id(ref_trail), None)
+
+    def invalidate_scene(self) -> None:
+        """Makes the next draw lay the trail out again, e.g. after a mountain's fields change."""
+        self.scene = None
+
+    def recording_scene(self) -> TrailScene:
+        """
+        Returns the scene draw_in_box records into, starting one if there is none.
+        A scene started here wasn't laid out by draw, so the next draw lays the trail out again.
+        """
+        if self.scene is None:
+            self.scene = TrailScene()
+            self.scene_key = None
+        return self.scene
+
+    def set_box(self, node: TrailStore|Trail, name: str, box: Box) -> None:
+        """Sets one of a trail node's click boxes, e.g. a series' "mountain_box"."""
+        self.boxes.setdefault(id(node), (node, {}))[1][name] = box
+
+    def get_box(self, node: TrailStore|Trail, name: str) -> Box:
+        """Returns one of a trail node's click boxes, or a box holding no point if it hasn't been laid out yet."""
+        entry = self.boxes.get(id(node))
+        if entry is None or name not in entry[1]:
+            return Box(0, 0, -1, -1)
+        return entry[1][name]
+
+    def draw(self, height, width, minx, miny) -> None:
+        """
+        Draws the trail in a box, laying it out again only when the trail or the box has changed.
+
+        :complexity: O(N) when laid out again, where N is the number of trail nodes. Otherwise O(1) batched draws.
+        """
+        key = (id(self.trail), height, width, minx, miny)
+        if self.scene is None or self.scene_key != key:
+            self.scene = TrailScene()
+            self.scene_key = key
+            self.boxes = {}
+            self.draw_in_box(height, width, minx, miny)
+            # Every trail still in the tree was given a box, so drop the sizes of any that have been removed.
+            self.sizes = {node_id: entry for node_id, entry in self.sizes.items() if node_id in self.boxes}
+        self.scene.draw(self)
 
     def draw_in_box(self, height, width, minx, miny, cur_trail: TrailBox|None=None) -> None:
         if cur_trail is None:
@@ -109,9 +242,9 @@ class TrailDraw:
             cur_trail = cur_trail.store
         if cur_trail is None:
             self.draw_line(minx, miny + height/2, minx + width, miny + height/2)
-            ref_trail.trail_box = Box(minx, miny + height/2-self.LINE_VERTICAL_BOX, width, 2*self.LINE_VERTICAL_BOX)
+            self.set_box(ref_trail, "trail_box", Box(minx, miny + height/2-self.LINE_VERTICAL_BOX, width, 2*self.LINE_VERTICAL_BOX))
         elif isinstance(cur_trail, TrailSeries):
-            ref_trail.trail_box = Box(minx, miny, width, height)
+            self.set_box(ref_trail, "trail_box", Box(minx, miny, width, height))
             p1 = self.TOTAL_MOUNTAIN_WIDTH
             p2 = self.required_width(cur_trail.following)
             total = p1 + p2
@@ -129,13 +262,13 @@ class TrailDraw:
             self.draw_line(start_mountain_trail_x, mid, start_mountain_x, mid)
             self.draw_line(end_mountain_x, mid, end_mountain_trail_x, mid)
             mountain_actual_height = self.MOUNTAIN_HEIGHT * (end_mountain_x - start_mountain_x) / self.MIN_MOUNTAIN_WIDTH
-            cur_trail.before_box = Box(start_mountain_trail_x, mid - mountain_actual_height/2, start_mountain_x - start_mountain_trail_x, mountain_actual_height)
-            cur_trail.mountain_box = Box(start_mountain_x, mid - mountain_actual_height/2, end_mountain_x - start_mountain_x, mountain_actual_height)
-            cur_trail.after_box = Box(end_mountain_x, mid - mountain_actual_height/2, end_mountain_trail_x - end_mountain_x, mountain_actual_height)
+            self.set_box(cur_trail, "before_box", Box(start_mountain_trail_x, mid - mountain_actual_height/2, start_mountain_x - start_mountain_trail_x, mountain_actual_height))
+            self.set_box(cur_trail, "mountain_box", Box(start_mountain_x, mid - mountain_actual_height/2, end_mountain_x - start_mountain_x, mountain_actual_height))
+            self.set_box(cur_trail, "after_box", Box(end_mountain_x, mid - mountain_actual_height/2, end_mountain_trail_x - end_mountain_x, mountain_actual_height))
             # Draw rest
             self.draw_in_box(height, p2/total*width, minx+p1_total_dist, miny, cur_trail.following)
         else:
-            ref_trail.trail_box = Box(minx, miny, width, height)
+            self.set_box(ref_trail, "trail_box", Box(minx, miny, width, height))
             b1 = self.required_width(cur_trail.top)
             b2 = self.required_width(cur_trail.bottom)
             b3 = self.required_width(cur_trail.following)
@@ -157,8 +290,8 @@ class TrailDraw:
             # Draw branches
             self.draw_branch(minx, mid, minx+self.BRANCH_WIDTH, miny + bot_section + self.BRANCH_SEPARATION + top_section / 2, miny + bot_section / 2)
             self.draw_branch(minx + width - b3_dist, mid, minx + width - self.BRANCH_WIDTH - b3_dist, miny + bot_section + self.BRANCH_SEPARATION + top_section / 2, miny + bot_section / 2)
-            cur_trail.branch_start_box = Box(minx, mid - self.BRANCH_SEPARATION/2 - top_section/2, self.BRANCH_WIDTH, bot_section/2 + top_section/2 + self.BRANCH_SEPARATION)
-            cur_trail.branch_end_box = Box(minx+width-b3_dist-self.BRANCH_WIDTH, mid - self.BRANCH_SEPARATION/2 - top_section/2, self.BRANCH_WIDTH, bot_section/2 + top_section/2 + self.BRANCH_SEPARATION)
+            self.set_box(cur_trail, "branch_start_box", Box(minx, mid - self.BRANCH_SEPARATION/2 - top_section/2, self.BRANCH_WIDTH, bot_section/2 + top_section/2 + self.BRANCH_SEPARATION))
+            self.set_box(cur_trail, "branch_end_box", Box(minx+width-b3_dist-self.BRANCH_WIDTH, mid - self.BRANCH_SEPARATION/2 - top_section/2, self.BRANCH_WIDTH, bot_section/2 + top_section/2 + self.BRANCH_SEPARATION))
             # Draw top & bottom
             self.draw_in_box(top_section, branch_dist, minx+self.BRANCH_WIDTH, miny+bot_section+self.BRANCH_SEPARATION, cur_trail.top)
             self.draw_in_box(bot_section, branch_dist, minx+self.BRANCH_WIDTH, miny, cur_trail.bottom)
@@ -166,53 +299,18 @@ class TrailDraw:
             self.draw_in_box(height, b3_dist, minx + width - b3_dist, miny, cur_trail.following)
 
     def draw_line(self, sx, sy, ex, ey):
-        import arcade
-        arcade.draw_line(sx, sy, ex, ey, (0, 0, 0), 1)
+        self.recording_scene().lines.append((sx, sy, ex, ey))
 
     def draw_mountain(self, x, y, scale, obj: Mountain):
-        import arcade
-        sprite_list = arcade.SpriteList()
-        mountain = arcade.Sprite("img/hike.png", scale=self.MIN_MOUNTAIN_WIDTH/512 * scale)
-        mountain.center_x = x
-        mountain.center_y = y
-        sprite_list.append(mountain)
-        sprite_list.draw()
-        arcade.draw_text(
-            obj.difficulty_level,
-            x - self.MIN_MOUNTAIN_WIDTH * scale / 2,
-            y + self.MOUNTAIN_HEIGHT * scale / 2,
-            (237, 17, 68),
-            font_size=24,
-            font_name=("Montserrat", "calibri", "arial"),
-            anchor_x="center",
-            anchor_y="center"
-        )
-        arcade.draw_text(
-            obj.length,
-            x + self.MIN_MOUNTAIN_WIDTH * scale / 2,
-            y + self.MOUNTAIN_HEIGHT * scale / 2,
-            (17, 127, 245),
-            font_size=24,
-            font_name=("Montserrat", "calibri", "arial"),
-            anchor_x="center",
-            anchor_y="center"
-        )
-
+        self.recording_scene().mountains.append((x, y, scale, obj))
 
     def draw_branch(self, sx, sy, ex, ety, eby):
-        import arcade
-        bez_top = bezier((sx, sy), (av(sx, ex), sy), (av(sx, ex), ety), (ex, ety))
-        arcade.draw_line_strip([
-            bez_top(t/100)
-            for t in range(101)
-        ], (0, 0, 0), 1)
-        bez_bot = bezier((sx, sy), (av(sx, ex), sy), (av(sx, ex), eby), (ex, eby))
-        arcade.draw_line_strip([
-            bez_bot(t/100)
-            for t in range(101)
-        ], (0, 0, 0), 1)
-
-    def box_and_action(self, mouse_pos: tuple[float, float], mode=DrawMode, cur_trail: Trail|None=None, parent_sets: tuple[Trail, str]|None=None) -> tuple[Box|None, function|None, Trail|None]:
+        strips = self.recording_scene().strips
+        strips.append(bezier_polyline(((sx, sy), (av(sx, ex), sy), (av(sx, ex), ety), (ex, ety))))
+        strips.append(bezier_polyline(((sx, sy), (av(sx, ex), sy), (av(sx, ex), eby), (ex, eby))))
+
+    def box_and_action(self, mouse_pos: tuple[float, float], mode=DrawMode, cur_trail: Trail|None=None, parent_sets: tuple[Trail, str]|None=None, path: tuple[str, ...]=()) -> tuple[Box|None, function|None, Trail|None]:
+        # Each action's `edit` is its (target, op, path) for the edit journal.
         if cur_trail is None:
             ref_trail = self.trail
             cur_trail = self.trail.store
@@ -220,36 +318,41 @@ class TrailDraw:
         else:
             ref_trail = cur_trail
             cur_trail = cur_trail.store
-        if mouse_pos not in ref_trail.trail_box:
+        if mouse_pos not in self.get_box(ref_trail, "trail_box"):
             return None, None, None
         def set_m(ref, cur_method):
             def func(*m):
                 ref.store = cur_method(*m)
+            func.edit = ("store", cur_method.__name__, path)
             return func
         def set_parent(parent_set, cur_method):
             parent, attribute = parent_set
             def func(*m):
                 setattr(parent, attribute, cur_method(*m))
+            func.edit = ("trail", cur_method.__name__, path)
             return func
+        def get_mountain():
+            return cur_trail.mountain
+        get_mountain.edit = ("mountain", None, path)
         if cur_trail is None:
             if mode in [DrawMode.ADD_MOUNTAIN, DrawMode.ADD_BRANCH]:
-                return ref_trail.trail_box, set_parent(parent_sets, ref_trail.add_mountain_before if mode == DrawMode.ADD_MOUNTAIN else ref_trail.add_empty_branch_before), cur_trail
+                return self.get_box(ref_trail, "trail_box"), set_parent(parent_sets, ref_trail.add_mountain_before if mode == DrawMode.ADD_MOUNTAIN else ref_trail.add_empty_branch_before), cur_trail
         elif isinstance(cur_trail, TrailSeries):
-            if mouse_pos in cur_trail.before_box and mode in [DrawMode.ADD_MOUNTAIN, DrawMode.ADD_BRANCH]:
-                return cur_trail.before_box, set_m(ref_trail, cur_trail.add_mountain_before if mode == DrawMode.ADD_MOUNTAIN else cur_trail.add_empty_branch_before), cur_trail
-            if mouse_pos in cur_trail.mountain_box and mode in [DrawMode.REMOVE, DrawMode.EDIT]:
-                return cur_trail.mountain_box, (set_m(ref_trail, cur_trail.remove_mountain) if mode == DrawMode.REMOVE else lambda: cur_trail.mountain), cur_trail
-            if mouse_pos in cur_trail.after_box and mode in [DrawMode.ADD_MOUNTAIN, DrawMode.ADD_BRANCH]:
-                return cur_trail.after_box, set_m(ref_trail, cur_trail.add_mountain_after if mode == DrawMode.ADD_MOUNTAIN else cur_trail.add_empty_branch_after), cur_trail
-            return self.box_and_action(mouse_pos, mode, cur_trail.following, (cur_trail, 'following'))
+            if mouse_pos in self.get_box(cur_trail, "before_box") and mode in [DrawMode.ADD_MOUNTAIN, DrawMode.ADD_BRANCH]:
+                return self.get_box(cur_trail, "before_box"), set_m(ref_trail, cur_trail.add_mountain_before if mode == DrawMode.ADD_MOUNTAIN else cur_trail.add_empty_branch_before), cur_trail
+            if mouse_pos in self.get_box(cur_trail, "mountain_box") and mode in [DrawMode.REMOVE, DrawMode.EDIT]:
+                return self.get_box(cur_trail, "mountain_box"), (set_m(ref_trail, cur_trail.remove_mountain) if mode == DrawMode.REMOVE else get_mountain), cur_trail
+            if mouse_pos in self.get_box(cur_trail, "after_box") and mode in [DrawMode.ADD_MOUNTAIN, DrawMode.ADD_BRANCH]:
+                return self.get_box(cur_trail, "after_box"), set_m(ref_trail, cur_trail.add_mountain_after if mode == DrawMode.ADD_MOUNTAIN else cur_trail.add_empty_branch_after), cur_trail
+            return self.box_and_action(mouse_pos, mode, cur_trail.following, (cur_trail, 'following'), path + ('following',))
         else:
-            if mouse_pos in cur_trail.branch_start_box and mode == DrawMode.REMOVE:
-                return cur_trail.branch_start_box, set_m(ref_trail, cur_trail.remove_branch), cur_trail
-            if mouse_pos in cur_trail.branch_end_box and mode == DrawMode.REMOVE:
-                return cur_trail.branch_end_box, set_m(ref_trail, cur_trail.remove_branch), cur_trail
-            if mouse_pos in cur_trail.bottom.trail_box:
-                return self.box_and_action(mouse_pos, mode, cur_trail.bottom, (cur_trail, 'bottom'))
-            if mouse_pos in cur_trail.top.trail_box:
-                return self.box_and_action(mouse_pos, mode, cur_trail.top, (cur_trail, 'top'))
-            return self.box_and_action(mouse_pos, mode, cur_trail.following, (cur_trail, 'following'))
+            if mouse_pos in self.get_box(cur_trail, "branch_start_box") and mode == DrawMode.REMOVE:
+                return self.get_box(cur_trail, "branch_start_box"), set_m(ref_trail, cur_trail.remove_branch), cur_trail
+            if mouse_pos in self.get_box(cur_trail, "branch_end_box") and mode == DrawMode.REMOVE:
+                return self.get_box(cur_trail, "branch_end_box"), set_m(ref_trail, cur_trail.remove_branch), cur_trail
+            if mouse_pos in self.get_box(cur_trail.bottom, "trail_box"):
+                return self.box_and_action(mouse_pos, mode, cur_trail.bottom, (cur_trail, 'bottom'), path + ('bottom',))
+            if mouse_pos in self.get_box(cur_trail.top, "trail_box"):
+                return self.box_and_action(mouse_pos, mode, cur_trail.top, (cur_trail, 'top'), path + ('top',))
+            return self.box_and_action(mouse_pos, mode, cur_trail.following, (cur_trail, 'following'), path + ('following',))
         return None, None, None
@@ -0,0 +1,220 @@
+from __future__ import annotations
+from array import array
+from data_structures.linked_stack import LinkedStack
+
+from mountain import Mountain
+from trail import Trail, TrailSeries, TrailSplit, TrailStore
+
+from typing import TYPE_CHECKING, Iterator
+
+# Avoid circular imports for typing.
+if TYPE_CHECKING:
+    from binary_trail import BinaryTrailFile
+    from personality import WalkerPersonality
+
+class FlatTrail:
+    """
+    A trail compiled into parallel arrays, one entry per trail node.
+
+    Node i has kind `kinds[i]`. A series node holds mountain `mountains[mountain_of[i]]`,
+    and series and split nodes continue to node `following[i]`. Split nodes branch to
+    nodes `top[i]` and `bottom[i]`. Unused entries are -1.
+
+    Nodes are numbered children first, so every node's successors have smaller indices
+    and the root is the last node. Subtrails shared between parents are compiled once.
+
+    Unless stated otherwise, all methods have O(1) complexity.
+    """
+    EMPTY = 0
+    SERIES = 1
+    SPLIT = 2
+
+    def __init__(self, trail: Trail) -> None:
+        """
+        Compile a trail.
+
+        :complexity: O(N), where N is the number of trail nodes.
+        """
+        self.kinds = array("b")
+        self.mountain_of = array("l")
+        self.following = array("l")
+        self.top = array("l")
+        self.bottom = array("l")
+        self.mountains: list[Mountain] = []
+        self._trails: list[Trail] | None = None
+
+        node_index: dict[int, int] = {}
+        mountain_index: dict[int, int] = {}
+        stack_trail = LinkedStack()
+        stack_trail.push((trail, False))
+        while not stack_trail.is_empty():
+            current, children_done = stack_trail.pop()
+            if id(current) in node_index:
+                continue
+            store = current.store
+            if not children_done:
+                stack_trail.push((current, True))
+                if isinstance(store, TrailSeries):
+                    stack_trail.push((store.following, False))
+                elif isinstance(store, TrailSplit):
+                    stack_trail.push((store.following, False))
+                    stack_trail.push((store.bottom, False))
+                    stack_trail.push((store.top, False))
+                continue
+
+            node_index[id(current)] = len(self.kinds)
+            if store is None:
+                self._append(self.EMPTY, -1, -1, -1, -1)
+            elif isinstance(store, TrailSeries):
+                if id(store.mountain) not in mountain_index:
+                    mountain_index[id(store.mountain)] = len(self.mountains)
+                    self.mountains.append(store.mountain)
+                self._append(self.SERIES, mountain_index[id(store.mountain)], node_index[id(store.following)], -1, -1)
+            else:
+                self._append(
+                    self.SPLIT, -1, node_index[id(store.following)],
+                    node_index[id(store.top)], node_index[id(store.bottom)],
+                )
+        self.root = len(self.kinds) - 1
+
+    def _append(self, kind: int, mountain: int, following: int, top: int, bottom: int) -> None:
+        self.kinds.append(kind)
+        self.mountain_of.append(mountain)
+        self.following.append(following)
+        self.top.append(top)
+        self.bottom.append(bottom)
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def to_trail(self) -> Trail:
+        """
+        Returns the trail as objects again, ready for editing.
+
+        Shared nodes stay shared, and the same objects are returned on every call.
+
+        :complexity: O(N) the first time, where N is the number of nodes. O(1) afterwards.
+        """
+        if self._trails is None:
+            trails: list[Trail] = []
+            for i in range(len(self.kinds)):
+                if self.kinds[i] == self.EMPTY:
+                    trails.append(Trail(None))
+                elif self.kinds[i] == self.SERIES:
+                    trails.append(Trail(TrailSeries(self.mountains[self.mountain_of[i]], trails[self.following[i]])))
+                else:
+                    trails.append(Trail(TrailSplit(trails[self.top[i]], trails[self.bottom[i]], trails[self.following[i]])))
+            self._trails = trails
+        return self._trails[self.root]
+
+    def trail(self, node: int) -> Trail:
+        """Returns a lazy trail for a node, whose store is built from the arrays when first accessed."""
+        return LazyTrail(self, node)
+
+    def store(self, node: int) -> TrailStore:
+        """Builds the store of a node, with lazy trails for its successors."""
+        kind = self.kinds[node]
+        if kind == self.EMPTY:
+            return None
+        elif kind == self.SERIES:
+            return TrailSeries(self.mountains[self.mountain_of[node]], self.trail(self.following[node]))
+        return TrailSplit(self.trail(self.top[node]), self.trail(self.bottom[node]), self.trail(self.following[node]))
+
+    def follow_path(self, personality: WalkerPersonality) -> None:
+        """Follow a path and add mountains according to a personality, as Trail.follow_path does.
+
+        The walk reads the arrays directly. At each split the personality is shown lazy
+        trails for the branches, so only the nodes it looks into are built.
+
+        :complexity:
+        Best Case Complexity: O(1), where the first desicion is to stop.
+        Worst Case Complexity: O(n), where n is the number of nodes on the path taken.
+        """
+        from personality import PersonalityDecision
+
+        stack_following = LinkedStack()
+        node = self.root
+        while True:
+            kind = self.kinds[node]
+            if kind == self.SERIES:
+                personality.add_mountain(self.mountains[self.mountain_of[node]])
+                node = self.following[node]
+            elif kind == self.SPLIT:
+                choice = personality.select_branch(self.trail(self.top[node]), self.trail(self.bottom[node]))
+                if choice == PersonalityDecision.STOP:
+                    return
+                stack_following.push(self.following[node])
+                node = self.top[node] if choice == PersonalityDecision.TOP else self.bottom[node]
+            elif stack_following.is_empty():
+                return
+            else:
+                node = stack_following.pop()
+
+    def iter_mountains(self) -> Iterator[Mountain]:
+        """
+        Yields every mountain on the trail, in the same order as Trail.iter_mountains.
+
+        :complexity: O(N), where N is the number of trail nodes walked.
+        """
+        stack_node = LinkedStack()
+        stack_node.push(self.root)
+        while not stack_node.is_empty():
+            node = stack_node.pop()
+            kind = self.kinds[node]
+            if kind == self.SERIES:
+                yield self.mountains[self.mountain_of[node]]
+                stack_node.push(self.following[node])
+            elif kind == self.SPLIT:
+                stack_node.push(self.following[node])
+                stack_node.push(self.bottom[node])
+                stack_node.push(self.top[node])
+
+    def count_paths(self) -> int:
+        """
+        Returns the number of distinct paths through the trail.
+
+        Successors come before their nodes, so one pass in index order is enough.
+
+        :complexity: O(N), where N is the number of nodes.
+        """
+        counts = [0] * len(self.kinds)
+        for i in range(len(self.kinds)):
+            if self.kinds[i] == self.EMPTY:
+                counts[i] = 1
+            elif self.kinds[i] == self.SERIES:
+                counts[i] = counts[self.following[i]]
+            else:
+                counts[i] = (counts[self.top[i]] + counts[self.bottom[i]]) * counts[self.following[i]]
+        return counts[self.root]
+
+class LazyTrail(Trail):
+    """
+    A trail whose store is decoded from a binary trail file, or built from a flat trail,
+    the first time it is accessed.
+
+    Assigning a store, as the editor does, replaces it like on any other trail.
+    A lazy trail compares equal to any trail with the same structure, decoding it as needed.
+    """
+
+    __slots__ = ("_source", "_node", "_store")
+
+    def __init__(self, source: BinaryTrailFile | FlatTrail, node: int) -> None:
+        self._source = source
+        self._node = node
+
+    @property
+    def store(self) -> TrailStore:
+        if self._source is not None:
+            self._store = self._source.store(self._node)
+            self._source = None
+        return self._store
+
+    @store.setter
+    def store(self, store: TrailStore) -> None:
+        self._source = None
+        self._store = store
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Trail):
+            return NotImplemented
+        return self.store == other.store
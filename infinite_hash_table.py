@@ -1,16 +1,41 @@
-from data_structures.referential_array import ArrayR
+from typing import Iterator
+from data_structures.sparse_array import SparseArrayR
+from data_structures.linked_stack import LinkedStack
 from algorithms.mergesort import mergesort
 
 class InfiniteHashTable:
     """
     Unless stated otherwise, all methods have O(1) complexity.
+
+    Each level hashes one character of the key. When two keys collide, the cell is
+    replaced by (shared prefix, InfiniteHashTable) one level down.
+    `count` is the number of keys stored in this table and every table below it,
+    and `non_alpha_count` is how many of those contain a character outside a-z.
+    All operations walk down the levels iteratively.
+
+    Keys whose characters differ by a multiple of TABLE_SIZE - 1 (e.g. "us" and "As")
+    collide on every level, so splitting can never separate them. Once both keys have
+    run out they share the terminal slot, which then holds a list of (key, value) cells.
+
+    Most tables below the top only hold a couple of colliding keys, so each table
+    stores its slots in a SparseArrayR and keeps its attributes in __slots__.
     """
+    __slots__ = ("array", "count", "non_alpha_count", "level")
+
     TABLE_SIZE = 27
 
+    # Slots in lexicographic order for lowercase keys: keys ending at this level,
+    # then "a" to "z" (ord("a") lands in slot 19, wrapping around after slot 25).
+    SORTED_SLOTS = (
+        [TABLE_SIZE - 1]
+        + list(range(ord("a") % (TABLE_SIZE - 1), TABLE_SIZE - 1))
+        + list(range(ord("a") % (TABLE_SIZE - 1)))
+    )
+
     def __init__(self, level = None):
-        self.array:ArrayR[tuple[K, V]] = ArrayR(self.TABLE_SIZE)
+        self.array:SparseArrayR[tuple[K, V]] = SparseArrayR(self.TABLE_SIZE)
         self.count = 0
-        self.bot_level = True
+        self.non_alpha_count = 0
         #Initialise None argument for level: If level = None then self.level = 0
         if level is None:
             self.level = 0
@@ -22,6 +47,47 @@ class InfiniteHashTable:
             return ord(key[self.level]) % (self.TABLE_SIZE - 1)
         return self.TABLE_SIZE - 1
 
+    def _find(self, key):
+        """
+        Walk down to the cell holding key.
+
+        :raises KeyError: when the key doesn't exist.
+        :returns: The list of (table, position) pairs visited, ending at the key's cell.
+
+        complexity best case: O(hash(key)), where the item is in the top-most table.
+        complexity worst case: O(hash(key) * L), where L is the number of levels walked.
+        """
+        path = []
+        table = self
+        while True:
+            position = table.hash(key)
+            path.append((table, position))
+            cell = table.array[position]
+            if cell is None:
+                raise KeyError(key)
+            elif isinstance(cell, list):
+                self._bucket_index(cell, key)
+                return path
+            elif isinstance(cell[1], InfiniteHashTable):
+                table = cell[1]
+            elif cell[0] != key:
+                raise KeyError(key)
+            else:
+                return path
+
+    @staticmethod
+    def _bucket_index(bucket, key):
+        """
+        Returns the index of key in a terminal slot's list of colliding cells.
+
+        :raises KeyError: when the key doesn't exist.
+        :complexity: O(B * comp(str)), where B is the number of colliding keys.
+        """
+        for i, cell in enumerate(bucket):
+            if cell[0] == key:
+                return i
+        raise KeyError(key)
+
     def __getitem__(self, key):
         """
         Get the value at a certain key
@@ -29,88 +95,118 @@ class InfiniteHashTable:
         :raises KeyError: when the key doesn't exist.
 
         complexity best case: O(hash(key)), where we  find the value straight away.
-        complexity worst case: O(hash(key) * N), where N is how many times we have to recurse.
+        complexity worst case: O(hash(key) * L), where L is the number of levels walked.
         """
-        position = self.hash(key)
-
-        if isinstance(self.array[position][1], InfiniteHashTable):
-            internal_table = self.array[position][1]
-            internal_table.__getitem__(key)
-
-        elif self.array[position][0] != key:
-            raise KeyError
-        else:
-            return self.array[position][1]
+        table, position = self._find(key)[-1]
+        cell = table.array[position]
+        if isinstance(cell, list):
+            cell = cell[self._bucket_index(cell, key)]
+        return cell[1]
 
     def __setitem__(self, key, value):
         """
         Set an (key, value) pair in our hash table.
 
         complexity best case: O(hash(key)), where there are no collisions.
-        complexity worst case: O(hash(key) * N), where N is how many times we have to recurse.
+        complexity worst case: O(hash(key) * L), where L is the number of levels walked.
         """
-        position = self.hash(key)
-        
-        self.count += 1
+        path = []
+        table = self
+        while True:
+            path.append(table)
+            position = table.hash(key)
+            cell = table.array[position]
 
-        if self.array[position] is None: 
-            self.array[position] = (key, value)
+            if cell is None:
+                table.array[position] = (key, value)
+                break
 
-        elif self.array[position][0] == key:
-            self.count -= 1
-            self.array[position] = (key, value)
-            
+            elif isinstance(cell, list):
+                try:
+                    # Overwriting, so no counts change.
+                    cell[self._bucket_index(cell, key)] = (key, value)
+                    return
+                except KeyError:
+                    cell.append((key, value))
+                    break
 
-        elif isinstance(self.array[position][1], InfiniteHashTable):
-            internal_table = self.array[position][1]
-            internal_table.__setitem__(key, value)
+            elif isinstance(cell[1], InfiniteHashTable):
+                table = cell[1]
 
-        else:
-            self.bot_level = False
-            collision_cell = self.array[position]
-            internal_table = InfiniteHashTable(self.level+1)
-            new_collision_pos = internal_table.hash(collision_cell[0])
-            internal_table.array[new_collision_pos] = collision_cell
-            internal_table.count += 1
-            self.array[position] = (key[:self.level+1], internal_table)
-            internal_table.__setitem__(key, value)
+            elif cell[0] == key:
+                # Overwriting, so no counts change.
+                table.array[position] = (key, value)
+                return
+
+            elif position == self.TABLE_SIZE - 1:
+                # Both keys end at this level, so another level down would collide again.
+                table.array[position] = [cell, (key, value)]
+                break
+
+            else:
+                # Push the existing key one level down, and keep walking there.
+                internal_table = InfiniteHashTable(table.level+1)
+                internal_table.array[internal_table.hash(cell[0])] = cell
+                internal_table.count = 1
+                internal_table.non_alpha_count = 0 if self._in_alphabet(cell[0]) else 1
+                table.array[position] = (key[:table.level+1], internal_table)
+                table = internal_table
+
+        non_alpha = 0 if self._in_alphabet(key) else 1
+        for table in path:
+            table.count += 1
+            table.non_alpha_count += non_alpha
 
     def __delitem__(self, key):
         """
         Deletes a (key, value) pair in our hash table.
 
+        If this leaves a table below the top with a single key, that key is moved up
+        to replace the highest such table.
+
         :raises KeyError: when the key doesn't exist.
 
         complexity best case: O(hash(key)), where we don't have to delete the internal tables.
-        complexity worst case: O(hash(key) * N), where N is the number of recursion.
-        """
-        self.del_helper(key)
-                
-    def del_helper(self, key):
-        position = self.hash(key)
-
-        if isinstance(self.array[position][1], InfiniteHashTable):
-            internal_table = self.array[position][1]
-            res = internal_table.del_helper(key)
-            self.count -= 1
-            if internal_table.count == 1 and internal_table.bot_level:
-                internal_table = None
-                new_position = self.hash(key)
-                self.array[new_position] = res
-                self.bot_level = True
-                return res
-            return res
-
-        elif self.array[position][0] != key:
-            raise KeyError
+        complexity worst case: O(hash(key) * L + A * L), where L is the number of levels walked
+                            and A is the size of the alphabet.
+        """
+        path = self._find(key)
+        table, position = path[-1]
+        cell = table.array[position]
+        if isinstance(cell, list):
+            del cell[self._bucket_index(cell, key)]
+            if len(cell) == 1:
+                table.array[position] = cell[0]
         else:
-            self.array[position] = None
-            self.count -= 1
-        if self.count == 1:
+            table.array[position] = None
+        non_alpha = 0 if self._in_alphabet(key) else 1
+        for table, _ in path:
+            table.count -= 1
+            table.non_alpha_count -= non_alpha
+
+        for i in range(1, len(path)):
+            table, _ = path[i]
+            if table.count == 1:
+                parent, parent_position = path[i-1]
+                parent.array[parent_position] = table._only_cell()
+                break
+
+    def _only_cell(self):
+        """
+        Returns the single (key, value) cell below a table holding exactly one key.
+
+        :complexity: O(A * L), where A is the size of the alphabet and L is the number of levels below.
+        """
+        table = self
+        while True:
             for i in range(self.TABLE_SIZE):
-                if self.array[i] is not None:
-                    return self.array[i]
-        
+                cell = table.array[i]
+                if cell is not None:
+                    break
+            if not isinstance(cell[1], InfiniteHashTable):
+                return cell
+            table = cell[1]
+
     def get_location(self, key):
         """
         Returns a list containing the indices required to retrieve a key.
@@ -118,43 +214,179 @@ class InfiniteHashTable:
         :raises KeyError: when the key doesn't exist.
 
         complexity best case: O(hash(key)), where the item is in the top-most table.
-        complexity worst case: O(hash(key) * N), where N is the number of recursion.
-        """
-        location = []
-        position = self.hash(key)
-        location.append(position)
-
-        if isinstance(self.array[position][1], InfiniteHashTable):
-            internal_table = self.array[position][1]
-            return location + internal_table.get_location(key)
-            
-        elif self.array[position][0] != key:
-            raise KeyError
-        else:
-            return location
+        complexity worst case: O(hash(key) * L), where L is the number of levels walked.
+        """
+        return [position for _, position in self._find(key)]
 
     def sort_keys(self):
         """
-        Sort a list using the mergesort operation.
-        :complexity: Best/Worst Case O(N∗A∗L), where N is the number of words inserted, 
-                    L is the length of the longest word and
+        Returns all keys in lexicographic order.
+        :complexity: See iter_sorted_keys.
+        """
+        return list(self.iter_sorted_keys())
+
+    def iter_sorted_keys(self) -> Iterator[str]:
+        """
+        Yields all keys in lexicographic order.
+
+        While every character a key was hashed on is lowercase, each of them had its own
+        slot, so walking slots in letter order (after the terminal slot, for keys that end
+        there) reaches the key in sorted order. Other characters share slots with letters,
+        so keys hashed on one are found in the tables holding them, and sorted apart.
+        They are then merged into the walk, which still streams every other key.
+
+        :complexity: O(N*L + T*A) when every key is lowercase, where N is the number of keys,
+                    L is the length of the longest key, T is the number of tables and
                     A is the size of the alphabet (26 in our case).
+                    Otherwise, O(U*logU * comp(str) + M*A) more, where U is the number of keys
+                    hashed on other characters and M the number of tables holding any key
+                    with such characters.
+        """
+        if self.non_alpha_count == 0:
+            yield from self._walk(self.SORTED_SLOTS)
+            return
+        out_of_order = mergesort([
+            key for key, level in self._walk_levels(range(self.TABLE_SIZE), non_alpha_only=True)
+            if not self._in_alphabet(key[:level+1])
+        ])
+        i = 0
+        for key, level in self._walk_levels(self.SORTED_SLOTS):
+            if not self._in_alphabet(key[:level+1]):
+                continue
+            while i < len(out_of_order) and out_of_order[i] < key:
+                yield out_of_order[i]
+                i += 1
+            yield key
+        yield from out_of_order[i:]
+
+    @staticmethod
+    def _in_alphabet(key) -> bool:
+        for char in key:
+            if not "a" <= char <= "z":
+                return False
+        return True
+
+    def iter_keys(self) -> Iterator[str]:
+        """
+        Yields all keys in the table, walking each level in slot order.
+
+        :complexity: O(N * A), where N is the number of tables and A is the size of the alphabet.
+        """
+        return self._walk(range(self.TABLE_SIZE))
+
+    def _walk(self, slots) -> Iterator[str]:
+        """
+        Yields all keys in this table and the tables below it, visiting each level's slots in the given order.
+
+        :complexity: O(N * A), where N is the number of tables and A is the size of the alphabet.
+        """
+        for key, _ in self._walk_levels(slots):
+            yield key
+
+    def _walk_levels(self, slots, non_alpha_only=False) -> Iterator[tuple[str, int]]:
+        """
+        Yields (key, level) for all keys in this table and the tables below it, where level is
+        that of the table the key is stored in, visiting each level's slots in the given order.
+        With non_alpha_only, tables holding only lowercase keys are skipped.
+
+        :complexity: O(N * A), where N is the number of tables and A is the size of the alphabet.
         """
-        return mergesort(self.keys())
+        if non_alpha_only and self.non_alpha_count == 0:
+            return
+        stack = LinkedStack()
+        stack.push((self, 0))
+        while not stack.is_empty():
+            table, start = stack.pop()
+            for i in range(start, self.TABLE_SIZE):
+                cell = table.array[slots[i]]
+                if cell is None:
+                    continue
+                elif isinstance(cell, list):
+                    for key, _ in cell:
+                        yield key, table.level
+                elif isinstance(cell[1], InfiniteHashTable):
+                    if non_alpha_only and cell[1].non_alpha_count == 0:
+                        continue
+                    # Finish this table after the one below it.
+                    stack.push((table, i+1))
+                    stack.push((cell[1], 0))
+                    break
+                else:
+                    yield cell[0], table.level
 
     def keys(self):
-        res = []
-        for i in range(self.TABLE_SIZE):
-            if self.array[i] is None:
-                continue
-            elif isinstance(self.array[i][1], InfiniteHashTable):
-                internal_table = self.array[i][1]
-                # res + internal_table.keys()
-                internal_keys = internal_table.keys()
-                res = res + internal_keys
-            else:
-                res.append(self.array[i][0])
-        return res
-    
+        """
+        Returns all keys in the table.
+
+        :complexity: See iter_keys.
+        """
+        return list(self.iter_keys())
+
+    def _prefix_node(self, prefix):
+        """
+        Walk down to where every key starting with prefix is stored.
+
+        :returns: The table whose keys all share the first len(prefix) slots with prefix,
+                  or a lone (key, value) cell, or None when nothing can match.
+
+        complexity best case: O(1), where the prefix is empty.
+        complexity worst case: O(len(prefix)).
+        """
+        node = self
+        while node.level < len(prefix):
+            cell = node.array[node.hash(prefix)]
+            if cell is None or not isinstance(cell[1], InfiniteHashTable):
+                return cell
+            node = cell[1]
+        return node
+
+    def iter_keys_with_prefix(self, prefix) -> Iterator[str]:
+        """
+        Yields all keys starting with prefix, in the same order as iter_keys.
+
+        :complexity: O(len(prefix) + M * A), where M is the number of tables below the prefix
+                    and A is the size of the alphabet.
+        """
+        node = self._prefix_node(prefix)
+        if node is None:
+            return
+        elif not isinstance(node, InfiniteHashTable):
+            if node[0].startswith(prefix):
+                yield node[0]
+        elif node.non_alpha_count == 0 and self._in_alphabet(prefix):
+            yield from node.iter_keys()
+        else:
+            # Characters outside a-z share slots, so the walk may have picked up other keys.
+            for key in node.iter_keys():
+                if key.startswith(prefix):
+                    yield key
+
+    def keys_with_prefix(self, prefix):
+        """
+        Returns all keys starting with prefix.
+
+        :complexity: See iter_keys_with_prefix.
+        """
+        return list(self.iter_keys_with_prefix(prefix))
+
+    def count_prefix(self, prefix) -> int:
+        """
+        Returns the number of keys starting with prefix.
+
+        complexity best case: O(len(prefix)), where the prefix and every key below it is lowercase.
+        complexity worst case: O(len(prefix) + M * A), see iter_keys_with_prefix.
+        """
+        node = self._prefix_node(prefix)
+        if node is None:
+            return 0
+        elif not isinstance(node, InfiniteHashTable):
+            return 1 if node[0].startswith(prefix) else 0
+        elif node.non_alpha_count == 0 and self._in_alphabet(prefix):
+            return node.count
+        count = 0
+        for _ in self.iter_keys_with_prefix(prefix):
+            count += 1
+        return count
+
     def __len__(self):
-        return self.count
\ No newline at end of file
+        return self.count
@@ -0,0 +1,289 @@
+"""
+Append-only journal of trail edits, kept next to a trail file in stores/.
+
+The first line of `<file>.journal` names the snapshot of the file it applies to, by the
+size and modification time the file had when the journal was started:
+
+    {"snapshot": [size, mtime_ns]}
+
+Each later line is either one JSON edit:
+
+    {"target": ..., "op": ..., "path": [...], "mountain": {...}}
+
+or a save marker:
+
+    {"saved": true}
+
+`path` is the list of attributes ("top", "bottom" or "following") to follow from the
+root trail through each store to reach the edited trail. `target` says what is edited:
+
+    "trail"     the trail itself is replaced by trail.op(...), e.g. add_mountain_before
+    "store"     its store is replaced by store.op(...), e.g. remove_branch
+    "mountain"  the mountain in its series store is given new fields
+
+`mountain` holds the mountain fields the edit needs, if any.
+
+What a file holds as saved is the file with every edit up to the last save marker replayed
+onto it, so saving only appends a marker. Edits after the last marker are unsaved. Closing
+the window drops them, so they are only left behind by a crash, and can be recovered then.
+
+Once enough edits have been saved, or the window is closed, the journal is compacted by
+writing the saved trail over the file and removing the journal. A journal whose snapshot
+doesn't match the file, e.g. as compaction was cut short, or the file was replaced or
+touched, no longer applies. It may still hold saved edits, so it is moved aside to
+`<file>.journal.bad` rather than removed.
+"""
+from __future__ import annotations
+import dataclasses, json, os
+
+from binary_trail import load_binary, save_binary
+from mountain import Mountain
+from serialize import load_trail, write_trail
+from trail import Trail, TrailSeries, TrailSplit
+
+# The only edits a journal may replay, by target and op, with the store class each op needs.
+# Ops are looked up here rather than by name, so a damaged journal can't call anything else.
+TRAIL_EDITS = {
+    "add_mountain_before": Trail.add_mountain_before,
+    "add_empty_branch_before": Trail.add_empty_branch_before,
+}
+STORE_EDITS = {
+    "remove_mountain": (TrailSeries, TrailSeries.remove_mountain),
+    "add_mountain_before": (TrailSeries, TrailSeries.add_mountain_before),
+    "add_empty_branch_before": (TrailSeries, TrailSeries.add_empty_branch_before),
+    "add_mountain_after": (TrailSeries, TrailSeries.add_mountain_after),
+    "add_empty_branch_after": (TrailSeries, TrailSeries.add_empty_branch_after),
+    "remove_branch": (TrailSplit, TrailSplit.remove_branch),
+}
+PATH_STEPS = {
+    "top": TrailSplit,
+    "bottom": TrailSplit,
+    "following": (TrailSeries, TrailSplit),
+}
+SAVED = {"saved": True}
+
+def apply_edit(trail: Trail, edit: dict) -> Trail:
+    """
+    Applies a journal edit to a trail, returning the (possibly new) root trail.
+
+    :raises ValueError: when the edit isn't one the editor makes, or doesn't fit the trail.
+    :complexity: O(P), where P is the length of the edit's path.
+    """
+    parent, attribute = None, None
+    target = trail
+    for step in edit["path"]:
+        if step not in PATH_STEPS or not isinstance(target.store, PATH_STEPS[step]):
+            raise ValueError(f"Journal path step {step!r} doesn't fit the trail")
+        parent, attribute = target.store, step
+        target = getattr(target.store, step)
+
+    mountain = Mountain(**edit["mountain"]) if "mountain" in edit else None
+    if edit["target"] == "mountain":
+        if mountain is None or not isinstance(target.store, TrailSeries):
+            raise ValueError("Journal mountain edit doesn't fit the trail")
+        for field in dataclasses.fields(mountain):
+            setattr(target.store.mountain, field.name, getattr(mountain, field.name))
+        return trail
+
+    arguments = [] if mountain is None else [mountain]
+    if edit["target"] == "store":
+        if edit["op"] not in STORE_EDITS or not isinstance(target.store, STORE_EDITS[edit["op"]][0]):
+            raise ValueError(f"Unknown journal store edit {edit['op']!r}")
+        target.store = STORE_EDITS[edit["op"]][1](target.store, *arguments)
+        return trail
+    if edit["target"] != "trail" or edit["op"] not in TRAIL_EDITS:
+        raise ValueError(f"Unknown journal edit {edit['target']!r} {edit['op']!r}")
+    replacement = TRAIL_EDITS[edit["op"]](target, *arguments)
+    if parent is None:
+        return replacement
+    setattr(parent, attribute, replacement)
+    return trail
+
+class TrailJournal:
+    """
+    The journal of edits made to one trail file since it was last written in full.
+
+    Unless stated otherwise, all methods have O(1) complexity.
+    """
+    # Compaction is due once this many edits have been saved.
+    COMPACT_AFTER = 200
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.journal_path = path + ".journal"
+        # The number of saved and unsaved edits in the journal.
+        self.saved = 0
+        self.unsaved = 0
+        # The size of the journal up to its last save marker, which dropping unsaved edits truncates it to.
+        self.saved_size = 0
+        # Unsaved edits left behind by a crash, found by load.
+        self.recoverable: list[dict] = []
+
+    def __len__(self) -> int:
+        return self.saved + self.unsaved
+
+    def load(self) -> Trail:
+        """
+        Returns the trail as last saved: the file, with every saved edit replayed onto it.
+        Any unsaved edits left behind by a crash are kept aside for recover.
+
+        A final edit cut short by a crash is ignored. If any other edit can't be read or
+        replayed, or the journal was started on another snapshot of the file, the journal is
+        moved aside to `<file>.journal.bad` and the file is returned as is.
+
+        :complexity: O(N + E * P), where N is the size of the file, E the number of
+                    edits and P the length of the longest edit path.
+        """
+        trail = self._load_file()
+        self.saved, self.unsaved, self.saved_size, self.recoverable = 0, 0, 0, []
+        if not os.path.exists(self.journal_path):
+            return trail
+        try:
+            with open(self.journal_path, "rb") as f:
+                header = f.readline()
+                if not header.endswith(b"\n"):
+                    # Cut short before any edit was written, so there is nothing to keep.
+                    f.close()
+                    os.remove(self.journal_path)
+                    return trail
+                if json.loads(header) != {"snapshot": self._snapshot()}:
+                    raise ValueError(f"{self.journal_path} doesn't apply to {self.path}")
+                self.saved_size = complete_size = len(header)
+                pending = []
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    complete_size += len(line)
+                    edit = json.loads(line)
+                    if edit == SAVED:
+                        for saved_edit in pending:
+                            trail = apply_edit(trail, saved_edit)
+                        self.saved += len(pending)
+                        self.saved_size = complete_size
+                        pending = []
+                    else:
+                        pending.append(edit)
+            self.recoverable = pending
+            self.unsaved = len(pending)
+            # Cut off an edit cut short, so later edits start on a line of their own.
+            if os.path.getsize(self.journal_path) > complete_size:
+                with open(self.journal_path, "r+b") as f:
+                    f.truncate(complete_size)
+        except (ValueError, KeyError, TypeError):
+            # Edits replay onto the file in place, so load it again.
+            # The journal is kept aside, as it may hold saved edits the file doesn't.
+            os.replace(self.journal_path, self.journal_path + ".bad")
+            self.saved, self.unsaved, self.saved_size, self.recoverable = 0, 0, 0, []
+            trail = self._load_file()
+        return trail
+
+    def has_unsaved(self) -> bool:
+        """Whether load found unsaved edits left behind by a crash."""
+        return len(self.recoverable) > 0
+
+    def recover(self, trail: Trail) -> Trail:
+        """
+        Replays the unsaved edits load found onto the trail it returned, returning the
+        edited trail. The edits stay unsaved until the trail is saved.
+
+        If an edit can't be replayed, the unsaved edits are dropped, and the trail as
+        last saved is returned instead.
+
+        :complexity: O(E * P), where E is the number of edits and P the length of the longest edit path.
+        """
+        edits, self.recoverable = self.recoverable, []
+        try:
+            for edit in edits:
+                trail = apply_edit(trail, edit)
+        except (ValueError, KeyError, TypeError):
+            self.discard()
+            return self.load()
+        return trail
+
+    def record(self, target: str, op: str | None, path: list[str], mountain: Mountain | None = None) -> None:
+        """
+        Appends an unsaved edit, flushing it so it survives the session crashing.
+
+        :complexity: O(P), where P is the length of the path.
+        """
+        edit = {"target": target, "op": op, "path": list(path)}
+        if mountain is not None:
+            edit["mountain"] = dataclasses.asdict(mountain)
+        self._append(edit)
+        self.unsaved += 1
+
+    def needs_compaction(self) -> bool:
+        return self.saved >= self.COMPACT_AFTER
+
+    def save(self, trail: Trail) -> None:
+        """
+        Saves the edits recorded since the last save by appending a save marker, then
+        compacts the journal if enough edits have been saved. The trail is only needed to compact.
+
+        :complexity: O(1), or O(N) when compacting, where N is the number of trail nodes.
+        """
+        if self.unsaved > 0:
+            self._append(SAVED)
+            self.saved_size = os.path.getsize(self.journal_path)
+            self.saved += self.unsaved
+            self.unsaved = 0
+        if self.needs_compaction():
+            self.write(trail)
+
+    def write(self, trail: Trail) -> None:
+        """
+        Writes the trail to the file in full, then removes the journal, e.g. to save to a new file.
+
+        :complexity: O(N), where N is the number of trail nodes.
+        """
+        if self.path.endswith(".trail"):
+            save_binary(trail, self.path)
+        else:
+            temporary_path = self.path + ".tmp"
+            with open(temporary_path, "w") as f:
+                write_trail(trail, f)
+            os.replace(temporary_path, self.path)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.saved, self.unsaved, self.saved_size, self.recoverable = 0, 0, 0, []
+
+    def close(self) -> None:
+        """
+        Drops the unsaved edits, and folds any saved ones into the file, so that once the
+        window is closed the file alone holds the trail as last saved.
+
+        :complexity: O(1) when nothing was saved, otherwise as load then write.
+        """
+        self.discard()
+        if self.saved > 0:
+            self.write(self.load())
+
+    def discard(self) -> None:
+        """
+        Drops the unsaved edits, leaving the file as last saved.
+        """
+        if self.unsaved > 0 and os.path.exists(self.journal_path):
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(self.saved_size)
+        self.unsaved = 0
+        self.recoverable = []
+
+    def _load_file(self) -> Trail:
+        if self.path.endswith(".trail"):
+            return load_binary(self.path)
+        with open(self.path, "r") as f:
+            return load_trail(f)
+
+    def _snapshot(self) -> list[int]:
+        stat = os.stat(self.path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def _append(self, line: dict) -> None:
+        # Written as bytes, so the sizes load and discard work with are the ones on disk.
+        if not os.path.exists(self.journal_path):
+            header = (json.dumps({"snapshot": self._snapshot()}) + "\n").encode("utf-8")
+            with open(self.journal_path, "wb") as f:
+                f.write(header)
+            self.saved_size = len(header)
+        with open(self.journal_path, "ab") as f:
+            f.write((json.dumps(line) + "\n").encode("utf-8"))
@@ -5,7 +5,6 @@ Requires no student import, but will use your implemented classes as part of it'
 
 import arcade
 import arcade.gui as gui
-import json
 import sys
 import secrets
 from copy import copy
@@ -17,7 +16,7 @@ from trail import Trail, TrailSeries, TrailSplit
 from draw_trails import TrailDraw
 from mountain_organiser import MountainOrganiser
 from double_key_table import DoubleKeyTable
-from serialize import serialize, deserialize
+from journal import TrailJournal
 
 class MyWindow(arcade.Window):
     """ Painter Window """
@@ -250,6 +249,7 @@ class MyWindow(arcade.Window):
         self.manager.disable()
         self.is_saving = False
         self.file_manager.disable()
+        self.is_recovering = False
 
         # Visual calculations
         self.DRAW_PANEL = self.SCREEN_WIDTH - self.SIDEBAR_WIDTH
@@ -276,24 +276,61 @@ class MyWindow(arcade.Window):
     def setup(self) -> None:
         """Set up the game and initialize the variables."""
         self.reset()
-        self.mountain_manager = MountainManager()
         self.cur_filename = sys.argv[1] if len(sys.argv) > 1 else "basic.json"
-        with open(f"stores/{self.cur_filename}", "r") as f:
-            t = deserialize(json.loads(f.read()))
+        # Loads the file as last saved, with its journalled saves replayed.
+        # A journal that can't be replayed is moved aside, leaving the file as it is.
+        self.journal = TrailJournal(f"stores/{self.cur_filename}")
+        self.load_trail(self.journal.load())
+        # Edits are only left unsaved by a session that crashed.
+        if self.journal.has_unsaved():
+            self.offer_recovery()
+
+    def load_trail(self, t: Trail) -> None:
+        """Show a trail, and manage its mountains."""
+        self.mountain_manager = MountainManager()
         try:
             # Try to add all existing mountains
-            for mountain in t.collect_all_mountains():
+            for mountain in t.iter_mountains():
                 self.mountain_manager.add_mountain(mountain)
         except NotImplementedError:
             pass
         self.mountain = TrailDraw(t)
         self.draw_box = None
 
+    def offer_recovery(self) -> None:
+        self.is_recovering = True
+        self.recovery_manager = gui.UIManager()
+        self.recovery_manager.add(gui.UIMessageBox(
+            width=400,
+            height=200,
+            message_text=f"{self.cur_filename} has unsaved edits from a session that didn't close properly. Recover them?",
+            buttons=("Recover", "Discard"),
+            callback=self.on_recovery_chosen,
+        ))
+        self.recovery_manager.enable()
+
+    def on_recovery_chosen(self, button_text: str) -> None:
+        if button_text == "Recover":
+            # The recovered edits stay unsaved until the file is saved.
+            self.load_trail(self.journal.recover(self.mountain.trail))
+        else:
+            self.journal.discard()
+        self.is_recovering = False
+        self.recovery_manager.disable()
+
+    def on_close(self) -> None:
+        """
+        Drop any unsaved edits before closing, so only a crash leaves edits to recover,
+        and fold the saved ones into the file.
+        """
+        self.journal.close()
+        super().on_close()
+
     def on_draw(self) -> None:
         """Draw everything"""
         self.clear()
-        self.mountain.draw_in_box(self.SCREEN_HEIGHT, self.DRAW_PANEL, 0, 0)
-        if self.draw_box is not None and not (self.showing_graph or self.is_editing or self.is_saving):
+        self.mountain.draw(self.SCREEN_HEIGHT, self.DRAW_PANEL, 0, 0)
+        if self.draw_box is not None and not (self.showing_graph or self.is_editing or self.is_saving or self.is_recovering):
             arcade.draw_rectangle_filled(self.draw_box.x + self.draw_box.w/2, self.draw_box.y + self.draw_box.h/2, self.draw_box.w, self.draw_box.h, (0, 255, 0, 100))
         # UI - Draw Modes / Action buttons
         self.action_buttons.draw()
@@ -308,9 +345,13 @@ class MyWindow(arcade.Window):
             self.draw_graph_elems()
         elif self.is_saving:
             self.file_manager.draw()
+        elif self.is_recovering:
+            self.recovery_manager.draw()
 
     def on_mouse_press(self, x: int, y: int, button: int, modifiers: int) -> None:
         """Called when the mouse buttons are pressed."""
+        if self.is_recovering:
+            return
         if button == 1:
             if self.showing_graph:
                 self.showing_graph = False
@@ -334,16 +375,19 @@ class MyWindow(arcade.Window):
                             getattr(self, tracker)()
             else:
                 if self.box_action and not (self.is_editing or self.is_saving or self.showing_graph):
+                    target, op, path = self.box_action.edit
                     if self.cur_draw_mode == DrawMode.ADD_MOUNTAIN:
                         key = secrets.token_hex(2)
                         mountain = Mountain(f"default-{key}", 0, 0)
                         self.box_action(mountain)
+                        self.record_edit(target, op, path, mountain)
                         try:
                             self.mountain_manager.add_mountain(mountain)
                         except NotImplementedError:
                             pass
                     elif self.cur_draw_mode == DrawMode.ADD_BRANCH:
                         self.box_action()
+                        self.record_edit(target, op, path)
                     elif self.cur_draw_mode == DrawMode.REMOVE:
                         if isinstance(self.cur_trail, TrailSeries):
                             try:
@@ -351,8 +395,10 @@ class MyWindow(arcade.Window):
                             except NotImplementedError:
                                 pass
                         self.box_action()
+                        self.record_edit(target, op, path)
                     elif self.cur_draw_mode == DrawMode.EDIT:
                         self.cur_editing_mountain = self.box_action()
+                        self.cur_editing_path = path
                         self.input_mountain_name.text = self.cur_editing_mountain.name
                         self.input_difficulty_level.text = str(self.cur_editing_mountain.difficulty_level)
                         self.input_length.text = str(self.cur_editing_mountain.length)
@@ -390,7 +436,8 @@ class MyWindow(arcade.Window):
                 for x in colorsys.hls_to_rgb(index/total, 0.6, 0.6)
             ]
         groups = self.mountain_manager.group_by_difficulty()
-        to = MountainOrganiser()
+        # Every difficulty is known up front, so the organiser never rebuilds its counts.
+        to = MountainOrganiser([group[0].difficulty_level for group in groups])
         positions = DoubleKeyTable()
         positions.hash1 = lambda k: (k % positions.table_size)
         all_mountains = []
@@ -449,6 +496,7 @@ class MyWindow(arcade.Window):
         self.cur_editing_mountain.name = self.input_mountain_name.text
         self.cur_editing_mountain.difficulty_level = int(self.input_difficulty_level.text)
         self.cur_editing_mountain.length = int(self.input_length.text)
+        self.record_edit("mountain", None, self.cur_editing_path, self.cur_editing_mountain)
         try:
             self.mountain_manager.edit_mountain(old_mountain, self.cur_editing_mountain)
         except NotImplementedError:
@@ -461,16 +509,37 @@ class MyWindow(arcade.Window):
         self.manager.disable()
         self.cur_editing_mountain = None
 
+    def record_edit(self, target, op, path, mountain=None):
+        """
+        Clear the cached layout along an edit's path and the drawn scene, and journal the edit to the current file.
+        """
+        if target != "mountain":
+            self.mountain.invalidate_layout(path)
+        else:
+            self.mountain.invalidate_scene()
+        self.journal.record(target, op, path, mountain)
+
     def on_file_save_clicked(self, event):
         new_path = str(self.input_file_name.text)
-        with open(f"stores/{new_path}", "w") as f:
-            f.write(serialize(self.mountain.trail))
+        if new_path == self.cur_filename:
+            # Marks the journalled edits as saved, only rewriting the file now and then to compact the journal.
+            self.journal.save(self.mountain.trail)
+        else:
+            # A new file is written in full, dropping any journal left at it.
+            journal = TrailJournal(f"stores/{new_path}")
+            journal.write(self.mountain.trail)
+            # The old file's unsaved edits are saved in the new file now, so drop them.
+            self.journal.discard()
+            # Later edits are journalled against the new file.
+            self.cur_filename = new_path
+            self.journal = journal
         # Close the window.
         self.on_file_close_clicked(event)
 
     def on_file_close_clicked(self, event):
         self.is_saving = False
         self.file_manager.disable()
+        self.is_recovering = False
 
 def main():
     """ Main function """
@@ -3,6 +3,8 @@ from dataclasses import dataclass
 
 @dataclass
 class Mountain:
+    # Declared by hand, as dataclass(slots=True) needs Python 3.10.
+    __slots__ = ("name", "difficulty_level", "length")
 
     name: str
     difficulty_level: int
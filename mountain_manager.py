@@ -1,41 +1,108 @@
 from __future__ import annotations
 from mountain import Mountain
-import copy
 
 class MountainManager:
     """
     Unless stated otherwise, all methods have O(1) complexity.
+
+    Mountains are filed into buckets by difficulty. Mountains are mutable and unhashable,
+    so buckets and the identity map are keyed by id(mountain). The identity map remembers
+    which difficulty each mountain was filed under, as the GUI edits mountains in place.
     """
 
     def __init__(self) -> None:
-        self.mountains = []
+        # difficulty -> {id(mountain): mountain}, in insertion order.
+        self.difficulty_buckets: dict[int, dict[int, Mountain]] = {}
+        # id(mountain) -> difficulty it is currently filed under.
+        self.filed_difficulty: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.filed_difficulty)
 
     def add_mountain(self, mountain: Mountain) -> None:
-        self.mountains.append(mountain)
+        """
+        Add a mountain to the manager.
+
+        Each mountain object is held at most once, so adding one that is already held
+        does nothing. A trail may hold the same mountain object in several places, as an
+        interned trail does, and it is still only managed once. Equal but distinct
+        mountains are each held.
+        """
+        if id(mountain) in self.filed_difficulty:
+            return
+        self._file(mountain, mountain.difficulty_level)
 
     def remove_mountain(self, mountain: Mountain) -> None:
-        self.mountains.remove(mountain)
+        """
+        Remove a mountain from the manager.
+
+        :raises ValueError: when the mountain doesn't exist.
+
+        complexity best case: O(1), where this exact mountain object was added.
+        complexity worst case: O(B*comp), where we were given an equal copy and
+                                B is the number of mountains with that difficulty.
+        """
+        if id(mountain) in self.filed_difficulty:
+            self._unfile(mountain)
+            return
+        # Fall back to equality, as a copy of the original may be passed in.
+        for stored in self.difficulty_buckets.get(mountain.difficulty_level, {}).values():
+            if stored == mountain:
+                self._unfile(stored)
+                return
+        raise ValueError(f"{mountain} is not in the manager.")
 
     def edit_mountain(self, old: Mountain, new: Mountain) -> None:
-        self.remove_mountain(old)
-        self.add_mountain(new)
+        """
+        Replace old with new. Old is removed first, unless it is a copy of a mountain
+        we hold which was then edited in place into new. If new is already held, it is
+        just moved to the bucket for its new difficulty.
+
+        :raises ValueError: when old doesn't exist.
+
+        complexity best case: O(1)
+        complexity worst case: O(remove_mountain)
+        """
+        if new is not old and id(old) in self.filed_difficulty:
+            self._unfile(old)
+        elif id(new) not in self.filed_difficulty:
+            self.remove_mountain(old)
+
+        if id(new) not in self.filed_difficulty:
+            self.add_mountain(new)
+        elif self.filed_difficulty[id(new)] != new.difficulty_level:
+            self._unfile(new)
+            self._file(new, new.difficulty_level)
 
     def mountains_with_difficulty(self, diff: int) -> list[Mountain]:
         """
         Return a list of all mountains with this difficulty.
 
-        complexity best/worst case: O(N*comp), where N is the total number of mountains included in the list.
+        complexity best/worst case: O(B), where B is the number of mountains with this difficulty.
         """
-        return [mountain for mountain in self.mountains if mountain.difficulty_level == diff]
+        return list(self.difficulty_buckets.get(diff, {}).values())
 
     def group_by_difficulty(self) -> list[list[Mountain]]:
-        new_list = []
-        mountains_copy = copy.deepcopy(self.mountains)
-        mountain_iter = iter(self.mountains)
-        mountain_iter2 = iter(self.mountains)
-        for mountain in mountain_iter:
-            new_list.append([item for item in mountain_iter2 if item.difficulty_level == mountain.difficulty_level])
-        return new_list
-
-        
-            
+        """
+        Returns lists of mountains with the same difficulty, ordered by increasing difficulty.
+
+        complexity best/worst case: O(N + Dlog(D)), where N is the total number of mountains
+                                and D is the number of distinct difficulties.
+        """
+        return [
+            list(self.difficulty_buckets[diff].values())
+            for diff in sorted(self.difficulty_buckets)
+        ]
+
+    def _file(self, mountain: Mountain, diff: int) -> None:
+        if diff not in self.difficulty_buckets:
+            self.difficulty_buckets[diff] = {}
+        self.difficulty_buckets[diff][id(mountain)] = mountain
+        self.filed_difficulty[id(mountain)] = diff
+
+    def _unfile(self, mountain: Mountain) -> None:
+        diff = self.filed_difficulty.pop(id(mountain))
+        bucket = self.difficulty_buckets[diff]
+        del bucket[id(mountain)]
+        if len(bucket) == 0:
+            del self.difficulty_buckets[diff]
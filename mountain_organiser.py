@@ -1,18 +1,39 @@
 from __future__ import annotations
+from typing import Iterable
 from algorithms.mergesort import mergesort, merge
 from algorithms.binary_search import binary_search
-from data_structures.hash_table import LinearProbeTable
+from data_structures.hash_table import CompactLinearProbeTable
+from data_structures.fenwick_tree import FenwickTree
 
 from mountain import Mountain
 
 class MountainOrganiser:
     """
     Unless stated otherwise, all methods have O(1) complexity.
+
+    Mountains are ranked by (difficulty, insertion order). Rather than keeping the
+    full sorted list, we keep a Fenwick tree counting mountains per distinct difficulty,
+    and remember each mountain's offset among the mountains of its difficulty.
+    Mountains are never removed, so that offset never changes. The difficulty a mountain
+    was filed under is remembered with it, so editing the mountain afterwards doesn't move it.
+
+    A new difficulty means rebuilding the counts, so difficulties known in advance
+    can be passed in to lay the counts out once, up front.
     """
 
-    def __init__(self) -> None:
-        self.mountains_list = []
-        self.mountains_table = LinearProbeTable()
+    def __init__(self, difficulties: Iterable[int] = ()) -> None:
+        """
+        :complexity: O(Klog(K)), where K is the number of difficulties given.
+        """
+        # Sorted distinct difficulties, and the number of mountains with each.
+        self.difficulties = []
+        self.difficulty_sizes = []
+        self.difficulty_counts = FenwickTree([])
+        # name -> [(mountain, difficulty filed under, offset within that difficulty)], as names needn't be unique.
+        self.mountains_table = CompactLinearProbeTable()
+        difficulties = list(difficulties)
+        if len(difficulties) > 0:
+            self._add_difficulties(difficulties)
 
     def cur_position(self, mountain: Mountain) -> int:
         """
@@ -20,24 +41,68 @@ class MountainOrganiser:
 
         :raises KeyError: when the mountain doesn't exist.
 
-        complexity best case: O(1), where it is the only mountain or first mountain in the list.
-        complexity worst case: O(log(N)), where N is the total number of mountains included so far.
+        complexity best/worst case: O(hash(name) + S + log(D)), where S is the number of mountains
+                                    sharing its name and D is the number of distinct difficulties.
         """
-        if mountain not in self.mountains_list:
-            raise KeyError
+        for stored, difficulty, offset in self.mountains_table[mountain.name]:
+            if stored == mountain:
+                break
         else:
-            return self.mountains_table[mountain.name]
-        
+            raise KeyError(mountain.name)
+        index = binary_search(self.difficulties, difficulty)
+        return self.difficulty_counts.prefix_sum(index) + offset
+
     def add_mountains(self, mountains: list[Mountain]) -> None:
         """
         Adds a list of mountains to the organiser
 
-        complexity best/worst case: O(Mlog(M)+N), where M is the length of the input list, and
-                                N is the total number of mountains included so far.
+        Ties keep the existing order: earlier batches come first, and within a batch
+        mountains keep their input order.
+
+        complexity best case: O(M*log(D)), where M is the length of the input list,
+                                D is the number of distinct difficulties, and every
+                                difficulty has been seen before or was given up front.
+        complexity worst case: O(Mlog(M) + D), when the batch introduces new difficulties
+                                and the counts must be rebuilt.
         """
-        self.mountains_list = merge(self.mountains_list, mergesort(mountains, key=lambda x:x.difficulty_level), key=lambda x:x.difficulty_level)
+        new_difficulties = []
+        for mountain in mountains:
+            index = binary_search(self.difficulties, mountain.difficulty_level)
+            if index == len(self.difficulties) or self.difficulties[index] != mountain.difficulty_level:
+                new_difficulties.append(mountain.difficulty_level)
+        if len(new_difficulties) > 0:
+            self._add_difficulties(new_difficulties)
+
+        for mountain in mountains:
+            index = binary_search(self.difficulties, mountain.difficulty_level)
+            try:
+                named = self.mountains_table[mountain.name]
+            except KeyError:
+                named = self.mountains_table[mountain.name] = []
+            named.append((mountain, mountain.difficulty_level, self.difficulty_sizes[index]))
+            self.difficulty_sizes[index] += 1
+            self.difficulty_counts.add(index, 1)
 
-        for i, mountain in enumerate(self.mountains_list):
-            print(i, mountain.name)
-            self.mountains_table.__setitem__(mountain.name, i)
-       
+    def _add_difficulties(self, new_difficulties: list[int]) -> None:
+        """
+        Merge new difficulties into the sorted distinct list and rebuild the counts.
+
+        :complexity: O(Mlog(M) + D), where M is len(new_difficulties).
+        """
+        new_difficulties = mergesort(new_difficulties)
+        merged = merge(self.difficulties, new_difficulties)
+        difficulties = []
+        sizes = []
+        old_index = 0
+        for difficulty in merged:
+            if len(difficulties) > 0 and difficulties[-1] == difficulty:
+                continue
+            difficulties.append(difficulty)
+            if old_index < len(self.difficulties) and self.difficulties[old_index] == difficulty:
+                sizes.append(self.difficulty_sizes[old_index])
+                old_index += 1
+            else:
+                sizes.append(0)
+        self.difficulties = difficulties
+        self.difficulty_sizes = sizes
+        self.difficulty_counts = FenwickTree(sizes)
@@ -1,6 +1,7 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
 from enum import auto
+from typing import Hashable
 from base_enum import BaseEnum
 from mountain import Mountain
 from trail import Trail
@@ -11,10 +12,25 @@ class PersonalityDecision(BaseEnum):
     STOP = auto()
 
 class WalkerPersonality(ABC):
+    # Set to True when select_branch depends only on route_key and on the first store of
+    # each branch it is shown, including the difficulty of its mountain, so a trail can
+    # cache and replay the route. Only honoured on the class that sets it, not on its subclasses.
+    DETERMINISTIC = False
 
     def __init__(self) -> None:
         self.mountains = []
 
+    @classmethod
+    def is_deterministic(cls) -> bool:
+        return cls.__dict__.get("DETERMINISTIC", False)
+
+    def route_key(self) -> Hashable:
+        """
+        The state select_branch depends on, which keys cached routes.
+        Override this in a deterministic walker that has such state.
+        """
+        return type(self)
+
     def add_mountain(self, mountain: Mountain) -> None:
         self.mountains.append(mountain)
 
@@ -23,16 +39,22 @@ class WalkerPersonality(ABC):
         pass
 
 class TopWalker(WalkerPersonality):
+    DETERMINISTIC = True
+
     def select_branch(self, top_branch: Trail, bottom_branch: Trail) -> PersonalityDecision:
         # Always select the top branch
         return PersonalityDecision.TOP
 
 class BottomWalker(WalkerPersonality):
+    DETERMINISTIC = True
+
     def select_branch(self, top_branch: Trail, bottom_branch: Trail) -> PersonalityDecision:
         # Always select the bottom branch
         return PersonalityDecision.BOTTOM
 
 class LazyWalker(WalkerPersonality):
+    DETERMINISTIC = True
+
     def select_branch(self, top_branch: Trail, bottom_branch: Trail) -> PersonalityDecision:
         """
         Try looking into the first mountain on each branch,
@@ -40,9 +62,9 @@ class LazyWalker(WalkerPersonality):
         """
 
         # isinstance breaks across imports if running the original file as main
-        # So just check __class__.__name__ :(
-        top_m = top_branch.store.__class__.__name__ == "TrailSeries"
-        bot_m = bottom_branch.store.__class__.__name__ == "TrailSeries"
+        # So just check the class names, including those of base classes like InternedSeries' :(
+        top_m = any(cls.__name__ == "TrailSeries" for cls in type(top_branch.store).__mro__)
+        bot_m = any(cls.__name__ == "TrailSeries" for cls in type(bottom_branch.store).__mro__)
         if top_m and bot_m:
             if top_branch.store.mountain.difficulty_level < bottom_branch.store.mountain.difficulty_level:
                 return PersonalityDecision.TOP
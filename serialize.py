@@ -1,31 +1,46 @@
 from __future__ import annotations
-import dataclasses, json
+import dataclasses, io, json, re
+from json.decoder import scanstring
+from typing import IO, Iterator
 
+from data_structures.linked_stack import LinkedStack
 from trail import Trail, TrailSplit, TrailSeries
 from mountain import Mountain
 
-# https://stackoverflow.com/questions/51286748/make-the-python-json-encoder-support-pythons-new-dataclasses
-class EnhancedJSONEncoder(json.JSONEncoder):
-    def default(self, o):
-        if dataclasses.is_dataclass(o):
-            res = dataclasses.asdict(o)
-            self.remove_box(res)
-            return res
-        return super().default(o)
-
-    def remove_box(self, obj):
-        if isinstance(obj, dict):
-            rm_keys = list(filter(lambda x: x.endswith("_box"), obj.keys()))
-            for key in rm_keys:
-                del obj[key]
-            for key in obj.keys():
-                self.remove_box(obj[key])
-        if isinstance(obj, list):
-            for o in obj:
-                self.remove_box(o)
+def write_trail(trail: Trail, f: IO[str]) -> None:
+    """
+    Writes a trail to a file object as JSON.
+
+    Walks the trail once with an explicit stack, writing each dataclass field as it is reached.
+    Fields ending in _box hold drawing state, and are skipped.
+
+    :complexity: O(N), where N is the number of trail nodes.
+    """
+    # Holds JSON text still to write, and dataclasses still to expand into it.
+    stack_piece = LinkedStack()
+    stack_piece.push(trail)
+    while not stack_piece.is_empty():
+        piece = stack_piece.pop()
+        if isinstance(piece, str):
+            f.write(piece)
+            continue
+        names = [field.name for field in dataclasses.fields(piece) if not field.name.endswith("_box")]
+        stack_piece.push("}")
+        for i in range(len(names) - 1, -1, -1):
+            value = getattr(piece, names[i])
+            stack_piece.push(value if dataclasses.is_dataclass(value) else json.dumps(value))
+            stack_piece.push((", " if i > 0 else "") + json.dumps(names[i]) + ": ")
+        stack_piece.push("{")
 
 def serialize(trail):
-    return json.dumps(trail, cls=EnhancedJSONEncoder)
+    """
+    Returns a trail as JSON text.
+
+    :complexity: See write_trail.
+    """
+    f = io.StringIO()
+    write_trail(trail, f)
+    return f.getvalue()
 
 def deserialize(obj):
     if obj["store"] is None:
@@ -42,3 +57,174 @@ def deserialize(obj):
             deserialize(obj["store"]["following"])
         )
     return Trail(inside)
+
+CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = " \t\n\r"
+_NUMBER = re.compile(r'-?(?:0|[1-9][0-9]*)(\.[0-9]+)?([eE][-+]?[0-9]+)?')
+_LITERALS = {"true": True, "false": False, "null": None}
+
+# What an object holds, given the key it is stored under.
+_TRAIL, _STORE, _MOUNTAIN = range(3)
+_ROLES = {"store": _STORE, "following": _TRAIL, "top": _TRAIL, "bottom": _TRAIL, "mountain": _MOUNTAIN}
+_MOUNTAIN_FIELDS = frozenset(field.name for field in dataclasses.fields(Mountain))
+
+# Which token load_trail expects next.
+_VALUE, _FIRST_KEY, _KEY, _COLON, _COMMA, _END = range(6)
+_EXPECTED = {
+    _VALUE: "a value",
+    _FIRST_KEY: "a key or '}'",
+    _KEY: "a key",
+    _COLON: "':'",
+    _COMMA: "',' or '}'",
+    _END: "the end of the file",
+}
+
+def _iter_tokens(f: IO[str], chunk_size: int) -> Iterator[tuple[str, object]]:
+    """
+    Yields the JSON tokens in a file as (kind, value) pairs, reading it a chunk at a time.
+
+    Punctuation has its character as the kind, strings have kind "string" and
+    numbers, true, false and null have kind "value".
+
+    :raises json.JSONDecodeError: when the file is not valid JSON.
+    :complexity: O(C), where C is the number of characters in the file.
+    """
+    buffer = ""
+    pos = 0
+    eof = False
+    while True:
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        need_more = pos == len(buffer)
+        if not need_more:
+            char = buffer[pos]
+            if char in "{}[]:,":
+                yield char, None
+                pos += 1
+                continue
+            elif char == '"':
+                try:
+                    value, end = scanstring(buffer, pos + 1)
+                    yield "string", value
+                    pos = end
+                    continue
+                except json.JSONDecodeError:
+                    # The string may just continue in the next chunk.
+                    if eof:
+                        raise
+                    need_more = True
+            elif char in "tfn":
+                if len(buffer) - pos < 5 and not eof:
+                    need_more = True
+                else:
+                    for literal, value in _LITERALS.items():
+                        if buffer.startswith(literal, pos):
+                            yield "value", value
+                            pos += len(literal)
+                            break
+                    else:
+                        raise json.JSONDecodeError("Expecting value", buffer, pos)
+                    continue
+            else:
+                match = _NUMBER.match(buffer, pos)
+                if (match is None or match.end() == len(buffer)) and not eof:
+                    # The number may just continue in the next chunk.
+                    need_more = True
+                elif match is None:
+                    raise json.JSONDecodeError("Expecting value", buffer, pos)
+                else:
+                    number = match.group()
+                    yield "value", float(number) if match.group(1) or match.group(2) else int(number)
+                    pos = match.end()
+                    continue
+
+        if eof:
+            return
+        chunk = f.read(chunk_size)
+        eof = chunk == ""
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+def load_trail(f: IO[str], chunk_size: int = CHUNK_SIZE) -> Trail:
+    """
+    Reads a trail from a JSON file object, as deserialize(json.load(f)) would.
+
+    The file is read a chunk at a time, and each node is built with an explicit stack as soon
+    as its object closes, so neither the whole text nor deep recursion is needed.
+
+    :raises json.JSONDecodeError: when the file has a token that is not valid JSON.
+    :raises ValueError: when the tokens are not valid JSON, or do not describe a trail.
+    :complexity: O(C), where C is the number of characters in the file.
+    """
+    # Each open object is [role, fields, key of the value being read].
+    stack_object = LinkedStack()
+    result = None
+    state = _VALUE
+    for kind, value in _iter_tokens(f, chunk_size):
+        if kind == "{" and state == _VALUE:
+            if stack_object.is_empty():
+                role = _TRAIL
+            elif stack_object.peek()[0] == _MOUNTAIN or stack_object.peek()[2] not in _ROLES:
+                raise ValueError(f"Unexpected object under {stack_object.peek()[2]!r}")
+            else:
+                role = _ROLES[stack_object.peek()[2]]
+            stack_object.push([role, {}, None])
+            state = _FIRST_KEY
+            continue
+        elif kind in "[]" and state == _VALUE:
+            raise ValueError("Unexpected array in a trail")
+        elif kind == "string" and state in (_FIRST_KEY, _KEY):
+            stack_object.peek()[2] = value
+            state = _COLON
+            continue
+        elif kind == ":" and state == _COLON:
+            state = _VALUE
+            continue
+        elif kind == "," and state == _COMMA:
+            state = _KEY
+            continue
+        elif kind == "}" and state in (_FIRST_KEY, _COMMA):
+            role, fields, _ = stack_object.pop()
+            value = _build(role, fields)
+        elif kind not in ("string", "value") or state != _VALUE:
+            found = value if kind in ("string", "value") else kind
+            raise ValueError(f"Expecting {_EXPECTED[state]}, found {found!r}")
+
+        if stack_object.is_empty():
+            result = value
+            state = _END
+        else:
+            stack_object.peek()[1][stack_object.peek()[2]] = value
+            state = _COMMA
+    if state != _END:
+        raise ValueError("The file ends before the trail does")
+    if not isinstance(result, Trail):
+        raise ValueError("The file does not contain a trail")
+    return result
+
+def _build(role: int, fields: dict) -> Mountain | Trail | TrailSeries | TrailSplit:
+    """
+    Builds the node a closed object describes.
+
+    :raises ValueError: when the object is missing fields, has extra ones, or holds the wrong nodes.
+    """
+    if role == _MOUNTAIN:
+        if fields.keys() != _MOUNTAIN_FIELDS:
+            raise ValueError(f"A mountain needs the fields {sorted(_MOUNTAIN_FIELDS)}, not {sorted(fields)}")
+        return Mountain(**fields)
+    if role == _TRAIL:
+        if fields.keys() != {"store"}:
+            raise ValueError(f"A trail needs just a store, not {sorted(fields)}")
+        if fields["store"] is not None and not isinstance(fields["store"], (TrailSeries, TrailSplit)):
+            raise ValueError("A trail's store must be an object or null")
+        return Trail(fields["store"])
+    if fields.keys() == {"mountain", "following"}:
+        if not isinstance(fields["mountain"], Mountain) or not isinstance(fields["following"], Trail):
+            raise ValueError("A series needs a mountain and a following trail")
+        return TrailSeries(fields["mountain"], fields["following"])
+    if fields.keys() == {"top", "bottom", "following"}:
+        if not all(isinstance(branch, Trail) for branch in fields.values()):
+            raise ValueError("A split needs top, bottom and following trails")
+        return TrailSplit(fields["top"], fields["bottom"], fields["following"])
+    raise ValueError(f"A store needs a mountain and following, or top, bottom and following, not {sorted(fields)}")
@@ -135,3 +135,60 @@ class TestDoubleHash(unittest.TestCase):
         # with an iterator.
         self.assertRaises(BaseException, lambda: next(key_iterator))
         self.assertRaises(BaseException, lambda: next(value_iterator))
+
+    @number("3.6")
+    def test_bulk_set(self):
+        dt = DoubleKeyTable()
+        items = [((f"top{i % 40}", f"bot{i}"), i) for i in range(2000)]
+        dt.bulk_set(items)
+
+        self.assertEqual(len(dt), 40)
+        self.assertEqual(dt.table_size, 97)
+        for (key1, key2), value in items:
+            self.assertEqual(dt[key1, key2], value)
+        self.assertEqual(set(dt.keys("top3")), {f"bot{i}" for i in range(3, 2000, 40)})
+
+        # Normal inserts still work afterwards.
+        dt["top3", "extra"] = -1
+        self.assertEqual(dt["top3", "extra"], -1)
+
+    @number("3.7")
+    def test_rehash(self):
+        dt = DoubleKeyTable()
+        dt["May", "Jim"] = 1
+        dt["Kim", "Tim"] = 2
+        dt._rehash()
+        self.assertEqual(dt.table_size, 13)
+        self.assertEqual(dt["May", "Jim"], 1)
+        self.assertEqual(dt["Kim", "Tim"], 2)
+        self.assertEqual(set(dt.keys()), {"May", "Kim"})
+
+    @number("3.8")
+    def test_internal_tables(self):
+        dt = DoubleKeyTable()
+        dt.bulk_set([(("May", name), i) for i, name in enumerate(["Jim", "Tom", "Ben", "Liz"])])
+        internal_table = dt.top_level_hash_table["May"]
+        dt.keys("May")
+        dt.values("May")
+        # The hash comes from the class, not a closure attached to each table.
+        self.assertNotIn("hash", vars(internal_table))
+        for name in ["Jim", "Tom", "Ben", "Liz"]:
+            self.assertEqual(internal_table.hash(name), dt.hash2(name, internal_table))
+        self.assertEqual(internal_table.hash_many(["Jim", "Tom"]), [internal_table.hash("Jim"), internal_table.hash("Tom")])
+
+    @number("3.9")
+    def test_internal_table_sizes(self):
+        dt = DoubleKeyTable()
+        for i in range(100):
+            dt[f"top{i}", "only"] = i
+        # Each internal table starts small, as it only holds one key.
+        for key in dt.keys():
+            self.assertEqual(dt.top_level_hash_table[key].table_size, 3)
+
+        dt["top0", "second"] = -1
+        self.assertEqual(dt.top_level_hash_table["top0"].table_size, 5)
+        for i in range(10):
+            dt["top0", f"more{i}"] = i
+        self.assertEqual(dt.top_level_hash_table["top0"].table_size, 29)
+        self.assertEqual(dt.top_level_hash_table["top1"].table_size, 3)
+        self.assertEqual(dt["top0", "second"], -1)
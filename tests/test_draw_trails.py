@@ -0,0 +1,105 @@
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+from ed_utils.decorators import number
+
+from mountain import Mountain
+from trail import Trail, TrailInterner, TrailSeries, TrailSplit
+from draw_trails import TrailDraw
+
+class TestTrailDraw(unittest.TestCase):
+
+    def uncached_size(self, draw, trail):
+        """The sizes as the layout rules define them, recomputed from scratch."""
+        store = trail.store
+        if store is None:
+            return 0, draw.EMPTY_HEIGHT
+        elif isinstance(store, TrailSeries):
+            width, height = self.uncached_size(draw, store.following)
+            return draw.TOTAL_MOUNTAIN_WIDTH + width, max(draw.MOUNTAIN_HEIGHT, height)
+        top, bottom, following = (self.uncached_size(draw, t) for t in (store.top, store.bottom, store.following))
+        return (
+            2 * draw.BRANCH_WIDTH + max(top[0], bottom[0], draw.MIN_BRANCH_CONTENT_WIDTH) + following[0],
+            max(top[1] + draw.BRANCH_SEPARATION + bottom[1], following[1]),
+        )
+
+    @number("11.1")
+    def test_layout_cache(self):
+        trail = Trail(TrailSplit(
+            Trail(TrailSeries(Mountain("a", 1, 1), Trail(None))),
+            Trail(None),
+            Trail(TrailSeries(Mountain("b", 1, 1), Trail(None))),
+        ))
+        draw = TrailDraw(trail)
+        self.assertEqual((draw.required_width(), draw.required_height()), self.uncached_size(draw, trail))
+        self.assertEqual(draw.required_width(trail.store.top), draw.TOTAL_MOUNTAIN_WIDTH)
+
+        # An edit to the bottom branch only invalidates the path down to it.
+        bottom = trail.store.bottom
+        trail.store.bottom = bottom.add_empty_branch_before()
+        draw.invalidate_layout(("bottom",))
+        self.assertIn(id(trail.store.top), draw.sizes)
+        self.assertEqual((draw.required_width(), draw.required_height()), self.uncached_size(draw, trail))
+
+        # Long series lay out without recursion.
+        long_trail = Trail(None)
+        for i in range(5000):
+            long_trail = long_trail.add_mountain_before(Mountain(str(i), 1, 1))
+        self.assertEqual(TrailDraw(long_trail).required_width(), 5000 * TrailDraw.TOTAL_MOUNTAIN_WIDTH)
+
+    @number("11.2")
+    def test_scene_recording(self):
+        trail = Trail(TrailSplit(
+            Trail(TrailSeries(Mountain("a", 1, 1), Trail(None))),
+            Trail(None),
+            Trail(TrailSeries(Mountain("b", 1, 1), Trail(None))),
+        ))
+        draw = TrailDraw(trail)
+        draw.draw_in_box(700, 600, 0, 0)
+        self.assertListEqual([mountain.name for _, _, _, mountain in draw.scene.mountains], ["a", "b"])
+        # Two curves at each end of the split.
+        self.assertEqual(len(draw.scene.strips), 4)
+        self.assertTrue(all(len(strip) == 101 for strip in draw.scene.strips))
+        self.assertEqual(draw.scene.strips[0][0], (0, 350))
+        # Click boxes are still laid out alongside.
+        self.assertEqual(draw.get_box(trail.store.top.store, "before_box").x, TrailDraw.BRANCH_WIDTH)
+
+        draw.invalidate_layout(())
+        self.assertIsNone(draw.scene)
+        # Recording again starts a new scene.
+        draw.draw_in_box(700, 600, 0, 0)
+        self.assertEqual(len(draw.scene.mountains), 2)
+
+
+    @number("11.3")
+    def test_layout_leaves_trails_alone(self):
+        branch = lambda: Trail(TrailSeries(Mountain("a", 1, 1), Trail(None)))
+        trail = Trail(TrailSplit(branch(), branch(), branch()))
+        interned = TrailInterner().intern(trail)
+        # Shared, immutable nodes lay out like the trail they were interned from.
+        draw = TrailDraw(interned)
+        self.assertEqual((draw.required_width(), draw.required_height()), self.uncached_size(draw, trail))
+        draw.draw_in_box(700, 600, 0, 0)
+        self.assertEqual(len(draw.scene.mountains), 3)
+        for node in [interned, interned.store, interned.store.top.store]:
+            self.assertFalse(hasattr(node, "__dict__"))
+
+    @number("11.4")
+    def test_scene_draws_cached_labels(self):
+        trail = Trail(TrailSeries(Mountain("a", 1, 2), Trail(TrailSeries(Mountain("b", 3, 4), Trail(None)))))
+        draw = TrailDraw(trail)
+        arcade = MagicMock()
+        with patch.dict(sys.modules, {"arcade": arcade}):
+            draw.draw(700, 600, 0, 0)
+            draw.draw(700, 600, 0, 0)
+
+        # Built once: a sprite and two labels per mountain, drawn one by one every frame,
+        # as arcade 2.6's Text takes no batch.
+        self.assertEqual(arcade.Sprite.call_count, 2)
+        self.assertEqual(arcade.Text.call_count, 4)
+        self.assertListEqual([call.args[0] for call in arcade.Text.call_args_list], ["1", "2", "3", "4"])
+        for call in arcade.Text.call_args_list:
+            self.assertNotIn("batch", call.kwargs)
+        self.assertEqual(arcade.Text.return_value.draw.call_count, 8)
+        self.assertEqual(arcade.ShapeElementList.return_value.draw.call_count, 2)
+        self.assertEqual(arcade.SpriteList.return_value.draw.call_count, 2)
@@ -0,0 +1,146 @@
+import unittest
+from unittest.mock import patch
+from ed_utils.decorators import number
+
+from data_structures.hash_table import LinearProbeTable, CompactLinearProbeTable, IncrementalLinearProbeTable
+import algorithms.string_hash as string_hash_module
+from algorithms.string_hash import string_hash, string_hash_many
+
+class TestHashTable(unittest.TestCase):
+
+    @number("8.1")
+    def test_compact_matches_linear_probe(self):
+        lt = LinearProbeTable()
+        ct = CompactLinearProbeTable()
+        names = [f"mountain-{i}" for i in range(300)]
+        for i, name in enumerate(names):
+            lt[name] = i
+            ct[name] = i
+        for name in names[::3]:
+            del lt[name]
+            del ct[name]
+        for name in names[::6]:
+            lt[name] = -1
+            ct[name] = -1
+
+        self.assertEqual(len(ct), len(lt))
+        self.assertEqual(ct.table_size, lt.table_size)
+        self.assertEqual(sorted(ct.keys()), sorted(lt.keys()))
+        for name in lt.keys():
+            self.assertEqual(ct[name], lt[name])
+        self.assertNotIn(names[3], ct)
+        self.assertRaises(KeyError, lambda: ct[names[3]])
+
+    @number("8.2")
+    def test_tombstones(self):
+        ct = CompactLinearProbeTable(sizes=[13])
+        ct.hash = lambda k: 0
+        ct["a"] = 1
+        ct["b"] = 2
+        ct["c"] = 3
+        del ct["b"]
+
+        # "c" is still reachable past the tombstone, and "d" reuses its slot.
+        self.assertEqual(ct["c"], 3)
+        self.assertEqual(ct._linear_probe("d", True), 1)
+        ct["d"] = 4
+        self.assertEqual(ct.tombstones, 0)
+
+        # Tombstones count towards load, so passing half compacts without growing.
+        ct = CompactLinearProbeTable(sizes=[13])
+        ct.hash = lambda k: ord(k) % 13
+        for key in "abcdef":
+            ct[key] = 0
+        for key in "bcdef":
+            del ct[key]
+        self.assertEqual(ct.tombstones, 5)
+        ct["g"] = 1
+        self.assertEqual(ct.table_size, 13)
+        self.assertEqual(ct.tombstones, 0)
+        self.assertEqual(set(ct.keys()), {"a", "g"})
+        self.assertEqual(ct._linear_probe("g", False), 12)
+
+    @number("8.3")
+    def test_bulk_load(self):
+        items = [(f"key-{i}", i) for i in range(1000)]
+        for table_type in [LinearProbeTable, CompactLinearProbeTable]:
+            resizes = []
+            class CountingTable(table_type):
+                def _resize(self, size_index):
+                    resizes.append(size_index)
+                    super()._resize(size_index)
+
+            table = CountingTable.from_items(iter(items), expected=len(items))
+            self.assertEqual(resizes, [9])
+            self.assertEqual(table.table_size, 3079)
+            self.assertEqual(len(table), 1000)
+
+            table.update([(f"key-{i}", -i) for i in range(500, 2000)])
+            self.assertEqual(resizes, [9, 10])
+            self.assertEqual(len(table), 2000)
+            self.assertEqual(table["key-999"], -999)
+            self.assertEqual(table["key-3"], 3)
+
+    @number("8.4")
+    def test_string_hash(self):
+        def loop_hash(key, table_size):
+            value = 0
+            a = 31415
+            for char in key:
+                value = (ord(char) + a * value) % table_size
+                a = a * 31 % (table_size - 1)
+            return value
+
+        keys = ["", "a", "Mount Kosciuszko", "mountain-" * 20, "Aoraki / Mt Cook", "Tim", "Jen"]
+        for table_size in [5, 13, 97, 1572869]:
+            expected = [loop_hash(key, table_size) for key in keys]
+            self.assertEqual(string_hash_many(keys, table_size), expected)
+            self.assertEqual([string_hash(key, table_size) for key in keys], expected)
+
+        # The memo never holds more than MEMO_LIMIT hashes, even within one batch.
+        many = [f"key-{i}" for i in range(100)]
+        with patch.object(string_hash_module, "MEMO_LIMIT", 16):
+            self.assertEqual(string_hash_many(many, 97), [loop_hash(key, 97) for key in many])
+            self.assertLessEqual(len(string_hash_module._memo), 16)
+            for key in many:
+                string_hash(key, 13)
+                self.assertLessEqual(len(string_hash_module._memo), 16)
+
+        table = LinearProbeTable()
+        self.assertEqual(table.hash_many(keys), [loop_hash(key, 5) for key in keys])
+        table.hash = lambda k: 0
+        self.assertEqual(table.hash_many(keys), [0] * len(keys))
+
+    @number("8.5")
+    def test_incremental_resize(self):
+        class SlowTable(IncrementalLinearProbeTable):
+            MIGRATE_STEP = 1
+
+        table = SlowTable()
+        for i in range(40):
+            table[f"key-{i}"] = i
+        self.assertTrue(table.is_resizing())
+        self.assertEqual(table.table_size, 97)
+
+        # Everything is reachable mid-resize, and probes return positions in the new array.
+        for i in range(40):
+            self.assertEqual(table[f"key-{i}"], i)
+        del table["key-7"]
+        self.assertNotIn("key-7", table)
+        self.assertEqual(len(table), 39)
+        self.assertEqual(len(table.keys()), 39)
+
+        for i in range(100):
+            _ = "key-0" in table
+        self.assertFalse(table.is_resizing())
+        self.assertEqual(sorted(table.values()), [i for i in range(40) if i != 7])
+
+    @number("8.6")
+    def test_instance_hash(self):
+        # A table's hash can still be overwritten on the instance.
+        table = LinearProbeTable()
+        table.hash = lambda k: 0
+        table["a"] = 1
+        table["b"] = 2
+        self.assertEqual(table._linear_probe("b", False), 1)
+        self.assertEqual(table.hash_many(["a", "b"]), [0, 0])
@@ -1,5 +1,9 @@
 import unittest
 from ed_utils.decorators import number
+from random import Random
+from unittest.mock import patch
+
+from algorithms.mergesort import mergesort
 
 from infinite_hash_table import InfiniteHashTable
 
@@ -91,3 +95,137 @@ class TestInfiniteHash(unittest.TestCase):
             "mining"
         ]
         self.assertListEqual(res, expected)
+
+    @number("4.4")
+    def test_nested_lookup(self):
+        ih = InfiniteHashTable()
+        ih["lin"] = 1
+        ih["leg"] = 2
+        ih["linked"] = 4
+        self.assertEqual(ih["lin"], 1)
+        self.assertEqual(ih["leg"], 2)
+        self.assertEqual(ih["linked"], 4)
+        self.assertRaises(KeyError, lambda: ih["link"])
+        self.assertRaises(KeyError, lambda: ih["zoo"])
+
+        # Long shared prefixes go far deeper than the recursion limit.
+        prefix = "a" * 3000
+        ih[prefix + "b"] = 5
+        ih[prefix + "c"] = 6
+        self.assertEqual(ih[prefix + "c"], 6)
+        self.assertEqual(len(ih.get_location(prefix + "b")), 3001)
+        self.assertEqual(set(ih.keys()), {"lin", "leg", "linked", prefix + "b", prefix + "c"})
+        del ih[prefix + "b"]
+        self.assertEqual(ih.get_location(prefix + "c"), [19])
+
+    @number("4.5")
+    def test_iter_sorted_keys(self):
+        ih = InfiniteHashTable()
+        # "h" and "a" sit either side of the slot wrap-around, and "ab" ends inside "abc"'s table.
+        for key in ["hat", "abc", "ab", "zed", "gap", "a"]:
+            ih[key] = 1
+        self.assertListEqual(list(ih.iter_sorted_keys()), ["a", "ab", "abc", "gap", "hat", "zed"])
+
+        # Characters outside a-z share slots, so only keys hashed on them are sorted apart.
+        ih["Zed"] = 2
+        ih["u"] = 3
+        ih["ha t"] = 4
+        # Stored at the top level, so only hashed on its "j".
+        ih["jo Ann"] = 5
+        with patch("infinite_hash_table.mergesort", wraps=mergesort) as sort:
+            self.assertListEqual(ih.sort_keys(), ["Zed", "a", "ab", "abc", "gap", "ha t", "hat", "jo Ann", "u", "zed"])
+        self.assertEqual(sort.call_count, 1)
+        self.assertCountEqual(sort.call_args.args[0], ["Zed", "ha t"])
+
+        random = Random(7)
+        keys = {"".join(random.choice("abcuzAZ [") for _ in range(random.randint(0, 4))) for _ in range(500)}
+        ih = InfiniteHashTable()
+        for key in keys:
+            ih[key] = 1
+        self.assertListEqual(ih.sort_keys(), sorted(keys))
+
+    @number("4.6")
+    def test_prefix_queries(self):
+        ih = InfiniteHashTable()
+        for key in ["lin", "leg", "mine", "linked", "limp", "mining", "jake", "linger"]:
+            ih[key] = 1
+        self.assertListEqual(sorted(ih.keys_with_prefix("lin")), ["lin", "linger", "linked"])
+        self.assertEqual(ih.count_prefix("lin"), 3)
+        self.assertEqual(ih.count_prefix("li"), 4)
+        self.assertEqual(ih.count_prefix("l"), 5)
+        self.assertEqual(ih.count_prefix(""), 8)
+        self.assertListEqual(ih.keys_with_prefix("ja"), ["jake"])
+        self.assertEqual(ih.count_prefix("jam"), 0)
+        self.assertEqual(ih.count_prefix("zoo"), 0)
+        self.assertEqual(ih.count_prefix("linkedin"), 0)
+
+        del ih["linger"]
+        self.assertEqual(ih.count_prefix("lin"), 2)
+
+        # "u" and "A" share a slot, so matches are checked against the prefix.
+        ih["us"] = 2
+        ih["As"] = 3
+        self.assertListEqual(ih.keys_with_prefix("u"), ["us"])
+        self.assertEqual(ih.count_prefix("A"), 1)
+        del ih["As"]
+        self.assertEqual(ih.count_prefix("u"), 1)
+
+    @number("4.7")
+    def test_dense_and_sparse_tables(self):
+        ih = InfiniteHashTable()
+        keys = [chr(c) + "x" for c in range(ord("a"), ord("z") + 1)] + ["ax", "ay", "axe"]
+        for i, key in enumerate(keys):
+            ih[key] = i
+        # The top table fills past the sparse threshold, the ones below it stay sparse.
+        self.assertIsNotNone(ih.array.full)
+        self.assertIsNone(ih.array[ih.hash("ax")][1].array.full)
+        self.assertEqual(ih.get_location("ax"), [19, 16, 26])
+        self.assertEqual(ih.get_location("axe"), [19, 16, 23])
+        self.assertEqual(ih.get_location("zx"), [18])
+        self.assertEqual(ih["ay"], 27)
+        self.assertListEqual(ih.sort_keys(), sorted(set(keys)))
+
+        del ih["axe"]
+        del ih["ay"]
+        self.assertEqual(ih.get_location("ax"), [19])
+        self.assertEqual(len(ih), 26)
+
+    @number("4.8")
+    def test_keys_colliding_on_every_level(self):
+        ih = InfiniteHashTable()
+        # "u", "A" and "[" all hash to slot 13, so these keys never split apart.
+        for i, key in enumerate(["uu", "AA", "[[", "u"]):
+            ih[key] = i
+        self.assertEqual(len(ih), 4)
+        self.assertEqual(ih["uu"], 0)
+        self.assertEqual(ih["AA"], 1)
+        self.assertEqual(ih["[["], 2)
+        self.assertEqual(ih.get_location("AA"), [13, 13, 26])
+        self.assertEqual(ih.get_location("u"), [13, 26])
+        self.assertRaises(KeyError, lambda: ih["[A"])
+        self.assertListEqual(ih.sort_keys(), ["AA", "[[", "u", "uu"])
+
+        ih["AA"] = 5
+        self.assertEqual(ih["AA"], 5)
+        self.assertEqual(len(ih), 4)
+
+        del ih["uu"]
+        del ih["[["]
+        self.assertEqual(ih["AA"], 5)
+        self.assertRaises(KeyError, lambda: ih["uu"])
+        del ih["u"]
+        self.assertEqual(ih.get_location("AA"), [13])
+        self.assertEqual(len(ih), 1)
+
+    @number("4.9")
+    def test_prefix_queries_on_colliding_pair(self):
+        ih = InfiniteHashTable()
+        ih["us"] = 1
+        ih["As"] = 2
+        self.assertEqual(ih["us"], 1)
+        self.assertEqual(ih["As"], 2)
+        self.assertListEqual(ih.keys_with_prefix("us"), ["us"])
+        self.assertListEqual(ih.keys_with_prefix("A"), ["As"])
+        self.assertEqual(ih.count_prefix("u"), 1)
+        self.assertEqual(ih.count_prefix("Az"), 0)
+        self.assertEqual(ih.count_prefix(""), 2)
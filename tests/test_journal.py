@@ -0,0 +1,170 @@
+import os
+import shutil
+import tempfile
+import unittest
+from ed_utils.decorators import number
+
+from mountain import Mountain
+from journal import TrailJournal, apply_edit
+from serialize import serialize
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "example.json")
+        shutil.copy("stores/basic.json", self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    @number("10.1")
+    def test_replay(self):
+        with open(self.path) as f:
+            saved_file = f.read()
+        journal = TrailJournal(self.path)
+        trail = journal.load()
+
+        # The same edits the window makes, journalled as it does.
+        new = Mountain("new", 1, 2)
+        trail.store = trail.store.add_mountain_after(new)
+        journal.record("store", "add_mountain_after", [], new)
+        split = trail.store.following.store.following
+        split.store = split.store.remove_branch()
+        journal.record("store", "remove_branch", ["following", "following"])
+        empty = trail.store.following
+        trail.store.following = empty.add_empty_branch_before()
+        journal.record("trail", "add_empty_branch_before", ["following"])
+        trail.store.mountain.name = "renamed"
+        journal.record("mountain", None, [], trail.store.mountain)
+        self.assertEqual(len(journal), 4)
+
+        # Saving only marks the edits as saved, leaving the file alone.
+        journal.save(trail)
+        with open(self.path) as f:
+            self.assertEqual(f.read(), saved_file)
+        reopened = TrailJournal(self.path)
+        self.assertEqual(serialize(reopened.load()), serialize(trail))
+        self.assertEqual(len(reopened), 4)
+        self.assertFalse(reopened.has_unsaved())
+
+        # An edit cut short by a crash is ignored, and cut off so later edits can follow it.
+        with open(journal.journal_path, "a") as f:
+            f.write('{"target": "store", "op": "remove_m')
+        reopened = TrailJournal(self.path)
+        self.assertEqual(serialize(reopened.load()), serialize(trail))
+        trail.store.mountain.name = "again"
+        reopened.record("mountain", None, [], trail.store.mountain)
+        reopened.save(trail)
+        self.assertEqual(serialize(TrailJournal(self.path).load()), serialize(trail))
+
+    @number("10.2")
+    def test_rejects_unknown_edits(self):
+        journal = TrailJournal(self.path)
+        trail = journal.load()
+        for edit in [
+            {"target": "store", "op": "__class__", "path": []},
+            {"target": "trail", "op": "follow_path", "path": []},
+            {"target": "store", "op": "remove_branch", "path": []},
+            {"target": "trail", "op": "add_empty_branch_before", "path": ["__dict__"]},
+            {"target": "delete", "op": "remove_mountain", "path": []},
+        ]:
+            self.assertRaises(ValueError, lambda: apply_edit(trail, edit))
+        self.assertEqual(serialize(trail), serialize(journal.load()))
+
+    @number("10.3")
+    def test_damaged_journal(self):
+        journal = TrailJournal(self.path)
+        trail = journal.load()
+        saved = serialize(trail)
+        new = Mountain("new", 1, 2)
+        journal.record("store", "add_mountain_after", [], new)
+        with open(journal.journal_path, "a") as f:
+            f.write('{"target": "store", "op": "remove_branch", "path": []}\n')
+            f.write('not json\n')
+        journal.save(trail)
+
+        # The file is loaded unedited, and the journal kept aside.
+        journal = TrailJournal(self.path)
+        self.assertEqual(serialize(journal.load()), saved)
+        self.assertEqual(len(journal), 0)
+        self.assertFalse(os.path.exists(journal.journal_path))
+        self.assertTrue(os.path.exists(journal.journal_path + ".bad"))
+
+    @number("10.4")
+    def test_unsaved_edits(self):
+        journal = TrailJournal(self.path)
+        trail = journal.load()
+        saved = serialize(trail)
+        trail.store.mountain.name = "renamed"
+        journal.record("mountain", None, [], trail.store.mountain)
+
+        # Unsaved edits left by a crash are only replayed when recovered, and stay unsaved.
+        crashed = TrailJournal(self.path)
+        loaded = crashed.load()
+        self.assertEqual(serialize(loaded), saved)
+        self.assertTrue(crashed.has_unsaved())
+        self.assertEqual(serialize(crashed.recover(loaded)), serialize(trail))
+        reopened = TrailJournal(self.path)
+        self.assertEqual(serialize(reopened.load()), saved)
+        self.assertTrue(reopened.has_unsaved())
+
+        # As when closing the window: the edits are dropped, the saved trail left alone.
+        reopened.discard()
+        reopened = TrailJournal(self.path)
+        self.assertEqual(serialize(reopened.load()), saved)
+        self.assertFalse(reopened.has_unsaved())
+        self.assertEqual(len(reopened), 0)
+
+    @number("10.5")
+    def test_compaction(self):
+        journal = TrailJournal(self.path)
+        journal.COMPACT_AFTER = 3
+        trail = journal.load()
+        for i in range(3):
+            trail.store.mountain.difficulty_level = i
+            journal.record("mountain", None, [], trail.store.mountain)
+            journal.save(trail)
+
+        # The saved edits are folded into the file itself.
+        self.assertFalse(os.path.exists(journal.journal_path))
+        with open(self.path) as f:
+            self.assertEqual(f.read(), serialize(trail))
+
+    @number("10.6")
+    def test_snapshot_mismatch(self):
+        journal = TrailJournal(self.path)
+        trail = journal.load()
+        original = serialize(trail)
+        trail.store.mountain.difficulty_level = 9
+        journal.record("mountain", None, [], trail.store.mountain)
+        journal.save(trail)
+        snapshot = os.stat(self.path)
+
+        # A journal started on another snapshot of the file doesn't apply to it...
+        os.utime(self.path, ns=(snapshot.st_atime_ns, snapshot.st_mtime_ns + 10**9))
+        reopened = TrailJournal(self.path)
+        self.assertEqual(serialize(reopened.load()), original)
+        self.assertFalse(os.path.exists(journal.journal_path))
+
+        # ...but its saved edits are kept aside, and still replay onto the snapshot they were made to.
+        os.utime(self.path, ns=(snapshot.st_atime_ns, snapshot.st_mtime_ns))
+        os.replace(journal.journal_path + ".bad", journal.journal_path)
+        self.assertEqual(serialize(TrailJournal(self.path).load()), serialize(trail))
+
+    @number("10.7")
+    def test_close(self):
+        journal = TrailJournal(self.path)
+        trail = journal.load()
+        trail.store.mountain.difficulty_level = 9
+        journal.record("mountain", None, [], trail.store.mountain)
+        journal.save(trail)
+        saved = serialize(trail)
+        trail.store.mountain.difficulty_level = 7
+        journal.record("mountain", None, [], trail.store.mountain)
+
+        # Closing drops the unsaved edit, and leaves the file as last saved with no journal.
+        journal.close()
+        self.assertFalse(os.path.exists(journal.journal_path))
+        with open(self.path) as f:
+            self.assertEqual(f.read(), saved)
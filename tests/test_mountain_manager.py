@@ -56,3 +56,67 @@ class TestInfiniteHash(unittest.TestCase):
         self.assertEqual(len(res), 4)
 
         self.assertEqual(make_set(res[3]), make_set([m10]))
+
+    @number("5.2")
+    def test_edit_in_place(self):
+        m1 = Mountain("m1", 2, 2)
+        m2 = Mountain("m2", 2, 9)
+        m3 = Mountain("m3", 5, 6)
+
+        mm = MountainManager()
+        mm.add_mountain(m1)
+        mm.add_mountain(m2)
+        mm.add_mountain(m3)
+
+        # The GUI copies the old mountain, then edits the original in place.
+        old = Mountain(m2.name, m2.difficulty_level, m2.length)
+        m2.difficulty_level = 5
+        mm.edit_mountain(old, m2)
+
+        self.assertEqual([id(m) for m in mm.mountains_with_difficulty(2)], [id(m1)])
+        self.assertEqual([id(m) for m in mm.mountains_with_difficulty(5)], [id(m3), id(m2)])
+
+        # Removing by an equal copy still works.
+        mm.remove_mountain(Mountain("m1", 2, 2))
+        res = mm.group_by_difficulty()
+        self.assertEqual(len(res), 1)
+        self.assertRaises(ValueError, lambda: mm.remove_mountain(m1))
+
+    @number("5.3")
+    def test_edit_to_held_mountain(self):
+        m1 = Mountain("m1", 2, 2)
+        m2 = Mountain("m2", 3, 9)
+        m3 = Mountain("m3", 3, 6)
+
+        mm = MountainManager()
+        mm.add_mountain(m1)
+        mm.add_mountain(m2)
+        mm.add_mountain(m3)
+
+        mm.edit_mountain(m1, m2)
+        self.assertEqual(len(mm), 2)
+        self.assertEqual(mm.mountains_with_difficulty(2), [])
+        self.assertEqual([id(m) for m in mm.mountains_with_difficulty(3)], [id(m2), id(m3)])
+
+        m3.difficulty_level = 4
+        mm.edit_mountain(m2, m3)
+        self.assertEqual(len(mm), 1)
+        self.assertEqual(mm.group_by_difficulty(), [[m3]])
+        self.assertRaises(ValueError, lambda: mm.edit_mountain(m1, Mountain("m4", 1, 1)))
+
+    @number("5.4")
+    def test_add_held_mountain(self):
+        m1 = Mountain("m1", 2, 2)
+        copy = Mountain("m1", 2, 2)
+
+        mm = MountainManager()
+        mm.add_mountain(m1)
+        # The same object is only held once, an equal copy is held as well.
+        mm.add_mountain(m1)
+        self.assertEqual(len(mm), 1)
+        self.assertEqual([id(m) for m in mm.mountains_with_difficulty(2)], [id(m1)])
+        mm.add_mountain(copy)
+        self.assertEqual(len(mm), 2)
+
+        mm.remove_mountain(m1)
+        self.assertEqual([id(m) for m in mm.mountains_with_difficulty(2)], [id(copy)])
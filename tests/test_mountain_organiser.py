@@ -31,3 +31,63 @@ class TestInfiniteHash(unittest.TestCase):
         self.assertEqual([mo.cur_position(m) for m in [m1, m2, m3, m4, m5, m6, m7, m8, m9]], [1, 8, 3, 0, 4, 2, 6, 7, 5])
 
         self.assertRaises(KeyError, lambda: mo.cur_position(m10))
+
+    @number("6.2")
+    def test_ties(self):
+        a = Mountain("a", 5, 1)
+        b = Mountain("b", 5, 2)
+        c = Mountain("c", 5, 3)
+        d = Mountain("d", 4, 4)
+
+        mo = MountainOrganiser()
+        mo.add_mountains([b, a])
+        mo.add_mountains([d, c])
+
+        # Earlier batches first, then input order within a batch.
+        self.assertEqual([mo.cur_position(m) for m in [a, b, c, d]], [2, 1, 3, 0])
+        self.assertRaises(KeyError, lambda: mo.cur_position(Mountain("a", 6, 1)))
+
+    @number("6.3")
+    def test_known_difficulties(self):
+        groups = [[Mountain(f"{d}-{i}", d, 1) for i in range(3)] for d in [7, 2, 5, 9]]
+
+        mo = MountainOrganiser([7, 2, 5, 9])
+        counts = mo.difficulty_counts
+        for group in groups:
+            mo.add_mountains(group)
+        # The counts were laid out once, and never rebuilt.
+        self.assertIs(mo.difficulty_counts, counts)
+        self.assertEqual([mo.cur_position(m) for m in groups[0]], [6, 7, 8])
+        self.assertEqual([mo.cur_position(m) for m in groups[3]], [9, 10, 11])
+
+        # Unexpected difficulties still work.
+        extra = Mountain("extra", 3, 1)
+        mo.add_mountains([extra])
+        self.assertEqual(mo.cur_position(extra), 3)
+        self.assertEqual(mo.cur_position(groups[0][0]), 7)
+
+    @number("6.4")
+    def test_shared_names(self):
+        easy = Mountain("peak", 1, 5)
+        hard = Mountain("peak", 8, 5)
+        long = Mountain("peak", 1, 9)
+        other = Mountain("other", 4, 1)
+
+        mo = MountainOrganiser()
+        mo.add_mountains([hard, easy])
+        mo.add_mountains([other, long])
+        self.assertEqual([mo.cur_position(m) for m in [easy, long, other, hard]], [0, 1, 2, 3])
+        self.assertRaises(KeyError, lambda: mo.cur_position(Mountain("peak", 4, 5)))
+
+    @number("6.5")
+    def test_edited_mountains(self):
+        a = Mountain("a", 5, 1)
+        b = Mountain("b", 3, 1)
+        c = Mountain("c", 7, 1)
+
+        mo = MountainOrganiser()
+        mo.add_mountains([a, b, c])
+        # A mountain edited after it was added keeps the rank it was filed under.
+        a.difficulty_level = 9
+        b.difficulty_level = 4
+        self.assertEqual([mo.cur_position(m) for m in [a, b, c]], [1, 0, 2])
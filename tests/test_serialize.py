@@ -0,0 +1,156 @@
+import dataclasses
+import io
+import json
+import mmap
+import os
+import tempfile
+import unittest
+from ed_utils.decorators import number
+
+from mountain import Mountain
+from trail import Trail, TrailSeries
+from draw_trails import Box, TrailSeriesBox
+from serialize import serialize, deserialize, load_trail, write_trail
+import binary_trail
+from binary_trail import load_binary, save_binary
+
+class TestSerialize(unittest.TestCase):
+
+    @number("9.1")
+    def test_load_trail(self):
+        for filename in ["basic.json", "methods_example.json"]:
+            with open(f"stores/{filename}") as f:
+                text = f.read()
+            expected = deserialize(json.loads(text))
+            self.assertEqual(load_trail(io.StringIO(text)), expected)
+            # Tokens split across tiny chunks.
+            self.assertEqual(load_trail(io.StringIO(text), chunk_size=3), expected)
+
+        trail = Trail(None).add_mountain_before(Mountain("café \"peak\"", -2, 15))
+        self.assertEqual(load_trail(io.StringIO(serialize(trail)), chunk_size=1), trail)
+        self.assertRaises(json.JSONDecodeError, lambda: load_trail(io.StringIO('{"store": nul}')))
+        self.assertRaises(ValueError, lambda: load_trail(io.StringIO('{"store": [1]}')))
+
+    @number("9.2")
+    def test_load_long_trail(self):
+        mountains = [Mountain(str(i), i % 10, 1) for i in range(10000)]
+        text = "".join(
+            '{"store": {"mountain": %s, "following": ' % json.dumps(dataclasses.asdict(mountain))
+            for mountain in mountains
+        ) + '{"store": null}' + "}}" * len(mountains)
+        trail = load_trail(io.StringIO(text))
+        self.assertListEqual(trail.collect_all_mountains(), mountains)
+
+    @number("9.3")
+    def test_binary_trail(self):
+        with open("stores/methods_example.json") as f:
+            text = f.read()
+        trail = load_trail(io.StringIO(text))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "example.trail")
+            save_binary(trail, path)
+            self.assertLess(os.path.getsize(path), len(text))
+
+            loaded = load_binary(path)
+            # Nothing below the root is decoded until it is reached.
+            self.assertIsNotNone(loaded.store.following._source)
+            self.assertEqual(serialize(loaded), serialize(trail))
+            self.assertListEqual(loaded.collect_all_mountains(), trail.collect_all_mountains())
+            self.assertEqual(load_binary(path), trail)
+            self.assertEqual(trail, load_binary(path))
+            self.assertNotEqual(load_binary(path), trail.add_empty_branch_before())
+
+            # Saving over the open file leaves an undecoded loaded trail readable.
+            loaded = load_binary(path)
+            edited = trail.add_mountain_before(Mountain("new", 1, 1))
+            source = loaded._source
+            save_binary(edited, path)
+            # The map is closed before the file is replaced, as Windows requires.
+            self.assertNotIsInstance(source.buffer, mmap.mmap)
+            self.assertEqual(serialize(loaded), serialize(trail))
+            self.assertEqual(serialize(load_binary(path)), serialize(edited))
+
+            with open(path, "wb") as f:
+                f.write(b"not a trail file")
+            self.assertRaises(ValueError, lambda: load_binary(path))
+
+    @number("9.4")
+    def test_write_trail(self):
+        with open("stores/methods_example.json") as f:
+            trail = load_trail(f)
+        self.assertEqual(serialize(trail), json.dumps(dataclasses.asdict(trail)))
+
+        # Drawing boxes are left out.
+        mountain = Mountain("boxed", 1, 2)
+        boxed = Trail(TrailSeriesBox(mountain, Trail(None), mountain_box=Box(1, 2, 3, 4)))
+        self.assertEqual(serialize(boxed), serialize(Trail(TrailSeries(mountain, Trail(None)))))
+
+        mountains = [Mountain(str(i), i % 10, 1) for i in range(10000)]
+        trail = Trail(None)
+        for mountain in reversed(mountains):
+            trail = trail.add_mountain_before(mountain)
+        f = io.StringIO()
+        write_trail(trail, f)
+        f.seek(0)
+        self.assertListEqual(load_trail(f).collect_all_mountains(), mountains)
+
+    @number("9.5")
+    def test_load_malformed_trail(self):
+        mountain = '{"name": "a", "difficulty_level": 1, "length": 2}'
+        for text in [
+            # Not JSON.
+            '{"store" null}',
+            '{,,"store":: null}',
+            '{"store": null,}',
+            '{"store": null null}',
+            '{"store": null}}',
+            '}',
+            '{"store": null',
+            '',
+            # JSON, but not a trail.
+            '{}',
+            '{"store": null, "extra": 1}',
+            '{"store": 5}',
+            '{"store": {"following": {"store": null}}}',
+            '{"store": {"mountain": %s}}' % mountain,
+            '{"store": {"mountain": %s, "following": null}}' % mountain,
+            '{"store": {"mountain": {"name": "a"}, "following": {"store": null}}}',
+            '{"store": {"top": {"store": null}, "bottom": {"store": null}}}',
+        ]:
+            with self.subTest(text=text):
+                self.assertRaises(ValueError, lambda: load_trail(io.StringIO(text)))
+
+    @number("9.6")
+    def test_truncated_binary_trail(self):
+        with open("stores/methods_example.json") as f:
+            trail = load_trail(f)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "example.trail")
+            save_binary(trail, path)
+            with open(path, "rb") as f:
+                data = f.read()
+            # Cut off within the header, and within the nodes.
+            for length in [10, len(data) // 2]:
+                with open(path, "wb") as f:
+                    f.write(data[:length])
+                self.assertRaises(ValueError, lambda: load_binary(path))
+                # The failed file's map was closed rather than kept open.
+                self.assertFalse(any(source.path == os.path.abspath(path) for source in binary_trail._mapped_files))
+
+    @number("9.7")
+    def test_corrupt_binary_trail(self):
+        trail = Trail(TrailSeries(Mountain("a", 1, 2), Trail(None)))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "example.trail")
+            save_binary(trail, path)
+            with open(path, "rb") as f:
+                data = f.read()
+            # The root is node 1, a series continuing to the empty node 0.
+            root_offset = binary_trail._HEADER.size + binary_trail._MOUNTAIN.size + binary_trail._NODE.size
+            for kind, mountain, following in [(1, 1, 0), (1, -1, 0), (1, 0, 2), (1, 0, -1), (3, 0, 0)]:
+                with self.subTest(kind=kind, mountain=mountain, following=following):
+                    corrupt = bytearray(data)
+                    binary_trail._NODE.pack_into(corrupt, root_offset, kind, mountain, following, -1, -1)
+                    with open(path, "wb") as f:
+                        f.write(corrupt)
+                    self.assertRaises(ValueError, lambda: load_binary(path).store.following.store)
@@ -2,7 +2,8 @@ import unittest
 from ed_utils.decorators import number
 
 from mountain import Mountain
-from trail import Trail, TrailSeries, TrailSplit, TrailStore
+from trail import Trail, TrailInterner, TrailSeries, TrailSplit, TrailStore
+from personality import TopWalker, BottomWalker, LazyWalker
 
 class TestTrailMethods(unittest.TestCase):
 
@@ -112,3 +113,69 @@ class TestTrailMethods(unittest.TestCase):
         self.assertIsInstance(res, TrailSeries)
         self.assertEqual(res.mountain, m)
         self.assertEqual(res.following.store, None)
+
+    @number("1.5")
+    def test_interned_trails(self):
+        interner = TrailInterner()
+        make_branch = lambda: Trail(TrailSeries(Mountain("a", 1, 2), Trail(TrailSeries(Mountain("b", 3, 4), Trail(None)))))
+        trail = Trail(TrailSplit(make_branch(), make_branch(), make_branch()))
+
+        interned = interner.intern(trail)
+        self.assertIs(interned.store.top, interned.store.bottom)
+        self.assertIs(interned.store.top, interned.store.following)
+        self.assertIs(interner.intern(Trail(TrailSplit(make_branch(), make_branch(), make_branch()))), interned)
+        # Empty, "b", "a" and the split.
+        self.assertEqual(len(interner), 4)
+        self.assertEqual(interned, trail)
+
+        # Persistent edits leave the shared nodes alone.
+        edited = interned.store.top.store.add_mountain_after(Mountain("c", 5, 6))
+        self.assertEqual(interned.store.bottom, make_branch())
+        self.assertIs(edited.following.store.following, interned.store.top.store.following)
+
+        # Shared nodes can't be edited in place, only once thawed.
+        def edit_in_place():
+            interned.store.top.store = None
+        def edit_mountain():
+            interned.store.top.store.mountain.difficulty_level = 9
+        self.assertRaises(AttributeError, edit_in_place)
+        self.assertRaises(AttributeError, edit_mountain)
+        thawed = TrailInterner.thaw(interned)
+        self.assertEqual(thawed, trail)
+        self.assertIsNot(thawed.store.top, thawed.store.bottom)
+        thawed.store.top.store.mountain.difficulty_level = 9
+        thawed.store.bottom.store = None
+        self.assertEqual(interned, trail)
+        self.assertEqual(thawed.store.following, make_branch())
+
+    @number("1.6")
+    def test_interned_nodes_are_slotted(self):
+        interner = TrailInterner()
+        trail = Trail(None)
+        for i in range(3000):
+            trail = trail.add_mountain_before(Mountain(str(i), i % 10, 1))
+        interned = interner.intern(trail)
+
+        # Equality between interned nodes is identity, so deep trails compare at once.
+        self.assertEqual(interned, interned)
+        self.assertNotEqual(interned, interner.intern(Trail(None)))
+        for node in [interned, interned.store, interned.store.mountain]:
+            self.assertFalse(hasattr(node, "__dict__"))
+
+    @number("1.7")
+    def test_interned_trails_walk_the_same(self):
+        make_branch = lambda: Trail(TrailSeries(Mountain("a", 1, 2), Trail(TrailSeries(Mountain("b", 3, 4), Trail(None)))))
+        trail = Trail(TrailSplit(
+            Trail(TrailSplit(make_branch(), Trail(TrailSeries(Mountain("c", 0, 1), Trail(None))), Trail(None))),
+            make_branch(),
+            make_branch(),
+        ))
+        interned = TrailInterner().intern(trail)
+        for make_walker in [TopWalker, BottomWalker, LazyWalker]:
+            walker, interned_walker = make_walker(), make_walker()
+            trail.follow_path(walker)
+            interned.follow_path(interned_walker)
+            self.assertListEqual(interned_walker.mountains, walker.mountains)
+        lazy = LazyWalker()
+        interned.follow_path(lazy)
+        self.assertListEqual([mountain.name for mountain in lazy.mountains], ["c", "a", "b"])
@@ -1,8 +1,12 @@
+import math
 import unittest
+from unittest.mock import patch
 from ed_utils.decorators import number, advanced
 
 from mountain import Mountain
 from trail import Trail, TrailSeries, TrailSplit
+from flat_trail import FlatTrail
+from personality import TopWalker, BottomWalker, LazyWalker
 
 class TestTrailMethods(unittest.TestCase):
 
@@ -86,3 +90,84 @@ class TestTrailMethods(unittest.TestCase):
         expected_res.sort()
 
         self.assertListEqual(res, expected_res)
+
+    @number("7.4")
+    def test_iter_mountains_long_series(self):
+        mountains = [Mountain(str(i), i % 10, 1) for i in range(5000)]
+        trail = Trail(None)
+        for mountain in reversed(mountains):
+            trail = trail.add_mountain_before(mountain)
+
+        self.assertListEqual(list(trail.iter_mountains()), mountains)
+        self.assertListEqual(trail.collect_all_mountains(), mountains)
+
+    @number("7.5")
+    def test_iter_paths(self):
+        self.load_example()
+        make_path_string = lambda mountain_list: ", ".join(map(lambda x: x.name, mountain_list))
+
+        self.assertListEqual(list(map(make_path_string, self.trail.iter_paths())), [
+            "top-top, top-mid, final",
+            "top-bot, top-mid, final",
+            "bot-one, bot-two, final",
+            "bot-one, final",
+            "bot-one, final",
+        ])
+        # Stopping early only walks as far as the first path.
+        self.assertEqual(make_path_string(next(self.trail.iter_difficulty_maximum_paths(5))), "bot-one, bot-two, final")
+        self.assertListEqual(list(Trail(None).iter_paths()), [[]])
+
+        mountains = [Mountain(str(i), i % 10, 1) for i in range(5000)]
+        trail = Trail(None)
+        for mountain in reversed(mountains):
+            trail = trail.add_mountain_before(mountain)
+        self.assertListEqual(trail.difficulty_difference_paths(9), [mountains])
+        self.assertListEqual(trail.difficulty_maximum_paths(8), [])
+
+    @number("7.6")
+    def test_path_statistics(self):
+        self.load_example()
+        paths = list(self.trail.iter_paths())
+        lengths = [sum(mountain.length for mountain in path) for path in paths]
+
+        self.assertEqual(self.trail.count_paths(), len(paths))
+        self.assertEqual(self.trail.count_difficulty_maximum_paths(5), len(self.trail.difficulty_maximum_paths(5)))
+        self.assertEqual(self.trail.count_difficulty_maximum_paths(-1), 0)
+        self.assertEqual(self.trail.min_path_length(), min(lengths))
+        self.assertEqual(self.trail.max_path_length(), max(lengths))
+        self.assertDictEqual(self.trail.path_length_histogram(), {9: 4, 11: 1})
+        self.assertEqual(Trail(None).count_paths(), 1)
+
+        # Every split doubles the paths, far past what could be enumerated.
+        trail = Trail(None)
+        for i in range(100):
+            trail = Trail(TrailSplit(Trail(TrailSeries(Mountain(str(i), 1, 1), Trail(None))), Trail(None), trail))
+        self.assertEqual(trail.count_paths(), 2 ** 100)
+        self.assertEqual(trail.max_path_length(), 100)
+        self.assertEqual(trail.path_length_histogram()[50], math.comb(100, 50))
+
+    @number("7.7")
+    def test_flat_trail(self):
+        self.load_example()
+        flat = FlatTrail(self.trail)
+        self.assertListEqual(list(flat.iter_mountains()), self.trail.collect_all_mountains())
+        self.assertEqual(flat.count_paths(), self.trail.count_paths())
+        self.assertEqual(flat.to_trail(), self.trail)
+
+        for personality in [TopWalker, BottomWalker, LazyWalker]:
+            flat_walker, walker = personality(), personality()
+            flat.follow_path(flat_walker)
+            self.trail.follow_path(walker)
+            self.assertListEqual(flat_walker.mountains, walker.mountains)
+        # Walking doesn't build the whole trail, which is built once and then kept.
+        flat = FlatTrail(self.trail)
+        with patch.object(FlatTrail, "to_trail", side_effect=AssertionError):
+            flat.follow_path(LazyWalker())
+        self.assertIs(flat.to_trail(), flat.to_trail())
+
+        # Shared subtrails are compiled once, and stay shared.
+        branch = Trail(TrailSeries(self.final, Trail(None)))
+        flat = FlatTrail(Trail(TrailSplit(branch, branch, branch)))
+        self.assertEqual(len(flat), 3)
+        shared = flat.to_trail().store
+        self.assertIs(shared.top, shared.following)
@@ -2,7 +2,8 @@ import unittest
 from ed_utils.decorators import number
 
 from mountain import Mountain
-from trail import Trail, TrailSeries, TrailSplit, TrailStore
+import trail
+from trail import Trail, TrailSeries, TrailSplit, TrailStore, TrailInterner
 from personality import WalkerPersonality, TopWalker, BottomWalker, LazyWalker, PersonalityDecision
 
 class TestTrailMethods(unittest.TestCase):
@@ -59,3 +60,149 @@ class TestTrailMethods(unittest.TestCase):
         self.trail.follow_path(cw)
 
         self.assertListEqual(cw.mountains, [self.bot_one])
+
+    @number("2.3")
+    def test_follow_paths(self):
+        class CustomWalker(WalkerPersonality):
+            def __init__(self, choices) -> None:
+                super().__init__()
+                self.count = 0
+                self.choices = choices
+            def select_branch(self, top_branch: Trail, bottom_branch: Trail) -> PersonalityDecision:
+                self.count += 1
+                return self.choices[self.count - 1]
+
+        self.load_example()
+        make_walkers = lambda: [
+            TopWalker(), BottomWalker(), LazyWalker(), TopWalker(),
+            CustomWalker([PersonalityDecision.BOTTOM, PersonalityDecision.STOP]),
+            CustomWalker([PersonalityDecision.TOP, PersonalityDecision.BOTTOM]),
+            CustomWalker([PersonalityDecision.STOP]),
+        ]
+        together = make_walkers()
+        self.trail.follow_paths(together)
+        for alone, walker in zip(make_walkers(), together):
+            self.trail.follow_path(alone)
+            self.assertListEqual(walker.mountains, alone.mountains)
+        self.assertListEqual(together[5].mountains, [self.top_bot, self.top_mid, self.final])
+
+        mountains = [Mountain(str(i), i % 10, 1) for i in range(5000)]
+        trail = Trail(None)
+        for mountain in reversed(mountains):
+            trail = trail.add_empty_branch_before().add_mountain_before(mountain)
+        walkers = [TopWalker(), BottomWalker()]
+        trail.follow_paths(walkers)
+        self.assertListEqual(walkers[0].mountains, mountains)
+        self.assertListEqual(walkers[1].mountains, mountains)
+
+    @number("2.4")
+    def test_route_cache(self):
+        class CountingTopWalker(TopWalker):
+            DETERMINISTIC = True
+            decisions = 0
+            def select_branch(self, top_branch: Trail, bottom_branch: Trail) -> PersonalityDecision:
+                CountingTopWalker.decisions += 1
+                return super().select_branch(top_branch, bottom_branch)
+
+        self.load_example()
+        for _ in range(3):
+            walker = CountingTopWalker()
+            self.trail.follow_path(walker)
+            self.assertListEqual(walker.mountains, [self.top_top, self.top_mid, self.final])
+        self.assertEqual(CountingTopWalker.decisions, 2)
+        # The cached route is shared, so callers can't change it.
+        self.assertEqual(self.trail.route(CountingTopWalker()), (self.top_top, self.top_mid, self.final))
+
+        # Editing the trail invalidates the cached route.
+        extra = Mountain("extra", 1, 1)
+        self.trail.store.following.store = self.trail.store.following.store.add_mountain_after(extra)
+        walker = CountingTopWalker()
+        self.trail.follow_paths([walker])
+        self.assertListEqual(walker.mountains, [self.top_top, self.top_mid, self.final, extra])
+        self.assertEqual(CountingTopWalker.decisions, 4)
+
+        # A trail's cached routes go with it.
+        trail_id = id(self.trail)
+        self.assertIn(trail_id, trail._route_caches)
+        del self.trail
+        self.assertNotIn(trail_id, trail._route_caches)
+
+    @number("2.5")
+    def test_route_cache_keys(self):
+        class StatefulTopWalker(TopWalker):
+            # Inherits DETERMINISTIC, but stops after a number of splits.
+            def __init__(self, splits) -> None:
+                super().__init__()
+                self.splits = splits
+            def select_branch(self, top_branch: Trail, bottom_branch: Trail) -> PersonalityDecision:
+                self.splits -= 1
+                return PersonalityDecision.TOP if self.splits >= 0 else PersonalityDecision.STOP
+
+        class KeyedWalker(WalkerPersonality):
+            DETERMINISTIC = True
+            def __init__(self, choice) -> None:
+                super().__init__()
+                self.choice = choice
+            def route_key(self):
+                return (KeyedWalker, self.choice.value)
+            def select_branch(self, top_branch: Trail, bottom_branch: Trail) -> PersonalityDecision:
+                return self.choice
+
+        self.load_example()
+        self.assertFalse(StatefulTopWalker.is_deterministic())
+        self.assertTrue(LazyWalker.is_deterministic())
+        self.trail.follow_path(TopWalker())
+        walker = StatefulTopWalker(1)
+        self.trail.follow_path(walker)
+        self.assertListEqual(walker.mountains, [])
+
+        top, bottom = KeyedWalker(PersonalityDecision.TOP), KeyedWalker(PersonalityDecision.BOTTOM)
+        self.trail.follow_paths([top, bottom])
+        self.assertListEqual(top.mountains, [self.top_top, self.top_mid, self.final])
+        self.assertListEqual(bottom.mountains, [self.bot_one, self.final])
+
+        # Mountains edited in place change where a cached lazy walker goes.
+        lazy = LazyWalker()
+        self.trail.follow_path(lazy)
+        self.assertListEqual(lazy.mountains, [self.top_bot, self.top_mid, self.final])
+        self.top_bot.difficulty_level = 9
+        lazy = LazyWalker()
+        self.trail.follow_path(lazy)
+        self.assertListEqual(lazy.mountains, [self.top_top, self.top_mid, self.final])
+
+    @number("2.6")
+    def test_route_cache_edits(self):
+        self.load_example()
+        self.trail.follow_paths([TopWalker(), BottomWalker()])
+
+        # Replacing the root store.
+        extra = Mountain("extra", 1, 1)
+        self.trail.store = TrailSeries(extra, Trail(self.trail.store))
+        walker = TopWalker()
+        self.trail.follow_path(walker)
+        self.assertListEqual(walker.mountains, [extra, self.top_top, self.top_mid, self.final])
+
+        # Replacing a store nested inside a branch.
+        bot_trail = self.trail.store.following.store.bottom.store.following
+        bot_trail.store = TrailSeries(self.top_mid, Trail(None))
+        walker = BottomWalker()
+        self.trail.follow_path(walker)
+        self.assertListEqual(walker.mountains, [extra, self.bot_one, self.top_mid, self.final])
+
+    @number("2.7")
+    def test_route_cache_interned(self):
+        class CountingTopWalker(TopWalker):
+            DETERMINISTIC = True
+            decisions = 0
+            def select_branch(self, top_branch: Trail, bottom_branch: Trail) -> PersonalityDecision:
+                CountingTopWalker.decisions += 1
+                return super().select_branch(top_branch, bottom_branch)
+
+        # Interned trails never change, so their routes are cached like any other trail's.
+        self.load_example()
+        interned = TrailInterner().intern(self.trail)
+        for _ in range(3):
+            walker = CountingTopWalker()
+            interned.follow_path(walker)
+            self.assertListEqual(walker.mountains, [self.top_top, self.top_mid, self.final])
+        self.assertEqual(CountingTopWalker.decisions, 2)
@@ -0,0 +1,54 @@
+import unittest
+from unittest import mock
+from ed_utils.decorators import number
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import utils
+from utils import bezier, bezier_polyline
+
+def recursive_bezier(*points):
+    """The reference definition: interpolate between the curves of the first and last points."""
+    if len(points) == 1:
+        return lambda t: points[0]
+    p1 = recursive_bezier(*points[:-1])
+    p2 = recursive_bezier(*points[1:])
+    return lambda t: ((1-t) * p1(t)[0] + t * p2(t)[0], (1-t) * p1(t)[1] + t * p2(t)[1])
+
+CURVES = [((0, 0), (5, 0), (5, 10), (10, 10)), ((1, 2),), ((0, 0), (3, 4)), ((0, 0), (1, 5), (2, -3), (4, 4), (7, 1))]
+
+class TestUtils(unittest.TestCase):
+
+    def assert_samples_curves(self, np):
+        # The module flag is patched either way, so this runs the branch for np whatever utils found installed.
+        for points in CURVES:
+            expected = [recursive_bezier(*points)(t / 100) for t in range(101)]
+            utils._polylines.clear()
+            with mock.patch.object(utils, "np", np):
+                polyline = bezier_polyline(points)
+            self.assertEqual(len(polyline), 101)
+            for (x, y), (ex, ey) in zip(polyline, expected):
+                self.assertAlmostEqual(x, ex)
+                self.assertAlmostEqual(y, ey)
+        utils._polylines.clear()
+
+    @number("12.1")
+    def test_bezier(self):
+        self.assert_samples_curves(None)
+        for points in CURVES:
+            self.assertAlmostEqual(bezier(*points)(0.3)[1], recursive_bezier(*points)(0.3)[1])
+
+        # Sampled curves are cached per control points.
+        points = ((0, 0), (5, 0), (5, 10), (10, 10))
+        self.assertIs(bezier_polyline(points), bezier_polyline(points))
+
+        self.assertEqual(bezier_polyline(points, samples=2), ((0.0, 0.0), (10.0, 10.0)))
+        self.assertRaises(ValueError, lambda: bezier_polyline(points, samples=1))
+
+    @number("12.2")
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_bezier_numpy(self):
+        self.assert_samples_curves(numpy)
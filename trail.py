@@ -1,15 +1,33 @@
 from __future__ import annotations
-from dataclasses import dataclass
+import weakref
+from dataclasses import dataclass, fields
 from data_structures.linked_stack import LinkedStack
 
 from mountain import Mountain
 
-from typing import TYPE_CHECKING, Union
+from typing import TYPE_CHECKING, Callable, Hashable, Iterable, Iterator, TypeVar, Union
 
 # Avoid circular imports for typing.
 if TYPE_CHECKING:
     from personality import WalkerPersonality
 
+T = TypeVar('T')
+
+# The routes cached for each trail by Trail.route, keyed by the trail's id, each
+# with a weak reference to its trail that drops the entry once the trail is collected.
+_route_caches: dict[int, tuple[weakref.ref, dict[Hashable, tuple[tuple[Mountain, ...], TrailStore, list, list]]]] = {}
+
+def _routes_of(trail: Trail) -> dict[Hashable, tuple[tuple[Mountain, ...], TrailStore, list, list]]:
+    """Returns the routes cached for a trail, keyed by route_key."""
+    key = id(trail)
+    entry = _route_caches.get(key)
+    if entry is None or entry[0]() is not trail:
+        def forget(ref: weakref.ref) -> None:
+            if key in _route_caches and _route_caches[key][0] is ref:
+                del _route_caches[key]
+        entry = _route_caches[key] = (weakref.ref(trail, forget), {})
+    return entry[1]
+
 @dataclass
 class TrailSplit:
     """
@@ -20,6 +38,8 @@ class TrailSplit:
       \____bottom____/
     """
 
+    __slots__ = ("top", "bottom", "following")
+
     top: Trail
     bottom: Trail
     following: Trail
@@ -37,6 +57,8 @@ class TrailSeries:
 
     """
 
+    __slots__ = ("mountain", "following")
+
     mountain: Mountain
     following: Trail
 
@@ -76,10 +98,30 @@ class TrailSeries:
 
 TrailStore = Union[TrailSplit, TrailSeries, None]
 
-@dataclass
+@dataclass(init=False)
 class Trail:
+    """
+    A trail, which is either empty or holds a series or a split.
+
+    Trails and their stores are slotted, and only hold the trail itself. State kept
+    about a trail elsewhere, like the route cache or the drawing code's boxes, is kept
+    in side tables keyed by the trail's identity.
+
+    Routes taken by deterministic personalities are cached per trail they were
+    taken from in `_route_caches`, keyed by the personality's route_key. With each route we
+    keep what the walk read: every trail, store and branch it went through, by identity,
+    and the difficulty of the first mountain on each branch it was shown. A cached
+    route is only replayed while all of those are unchanged, so any edit along it, in
+    place or not, and any difficulty edit a walker could have seen, makes it stale.
+    """
+
+    # Weakly referenceable, so a trail's cached routes go when it does.
+    __slots__ = ("store", "__weakref__")
+
+    store: TrailStore
 
-    store: TrailStore = None
+    def __init__(self, store: TrailStore = None) -> None:
+        self.store = store
 
     def add_mountain_before(self, mountain: Mountain) -> Trail:
         """
@@ -98,54 +140,527 @@ class Trail:
     def follow_path(self, personality: WalkerPersonality) -> None:
         """Follow a path and add mountains according to a personality.
 
+        A deterministic personality replays the route cached for its route_key, if nothing
+        it depended on has changed since, without re-evaluating any branch decisions.
+
         :complexity:
         Best Case Complexity: O(1), where the first desicion is to stop.
         Worst Case Complexity: O(n), where n is how deep/long the trail is, which is
         dependent on how many mountains the traveler is going to take.
         """
+        if personality.is_deterministic():
+            for mountain in self.route(personality):
+                personality.add_mountain(mountain)
+            return
+        for mountain in self._walk(personality):
+            personality.add_mountain(mountain)
+
+    def route(self, personality: WalkerPersonality) -> tuple[Mountain, ...]:
+        """
+        Returns the mountains a deterministic personality takes, caching the route for its route_key.
+        The route is a tuple, as it is shared with every later caller.
+
+        :complexity:
+        Best Case Complexity: O(1) for an interned trail's cached route, otherwise O(n) to check
+        the cached route, without any branch decisions.
+        Worst Case Complexity: O(n), see follow_path.
+        """
+        routes = _routes_of(self)
+        key = personality.route_key()
+        cached = routes.get(key)
+        if isinstance(self, _Interned):
+            # Everything below an interned trail is interned too, and never changes,
+            # so its routes are cached without recording what the walk read.
+            if cached is None:
+                cached = routes[key] = (tuple(self._walk(personality)), self.store, [], [])
+            return cached[0]
+        if cached is not None and self.store is cached[1] and self._unchanged(cached[2], cached[3]):
+            return cached[0]
+        # The trail's own store is kept apart from the other reads, which then never
+        # refer back to the trail, so its cache entry doesn't keep it alive.
+        store, reads, difficulties = self.store, [], []
+        route = tuple(self._walk(personality, reads, difficulties))
+        routes[key] = (route, store, reads, difficulties)
+        return route
+
+    @staticmethod
+    def _unchanged(reads: list[tuple[object, str, object]], difficulties: list[tuple[Mountain, int]]) -> bool:
+        """
+        Whether every attribute a walk read still holds the same object, and every
+        mountain it was shown still has the same difficulty.
+
+        :complexity: O(R), where R is the number of reads.
+        """
+        for holder, attribute, value in reads:
+            if getattr(holder, attribute) is not value:
+                return False
+        for mountain, difficulty in difficulties:
+            if mountain.difficulty_level != difficulty:
+                return False
+        return True
+
+    def _walk(self, personality: WalkerPersonality, reads: list | None = None, difficulties: list | None = None) -> Iterator[Mountain]:
+        """
+        Yields the mountains along the path chosen by a personality, asking it
+        for each branch decision as the path reaches the split.
+
+        When reads and difficulties are given, every (holder, attribute, value) the walk
+        reads below the trail's own store is added to reads, and the (mountain, difficulty) of the first mountain on
+        each branch shown to the personality is added to difficulties.
+
+        :complexity: See follow_path.
+        """
         from personality import PersonalityDecision
 
+        tracing = reads is not None
         stack_trailsplit = LinkedStack()
         current_path = self.store
         while current_path is not None:
             if isinstance(current_path, TrailSeries):
-                personality.add_mountain(current_path.mountain)
-                current_path = current_path.following.store
+                series = current_path
+                yield series.mountain
+                following = series.following
+                current_path = following.store
+                if tracing:
+                    reads.append((series, "mountain", series.mountain))
+                    reads.append((series, "following", following))
+                    reads.append((following, "store", current_path))
             elif isinstance(current_path, TrailSplit):
                 stack_trailsplit.push(current_path)
-                choice = personality.select_branch(current_path.top, current_path.bottom)
+                top, bottom = current_path.top, current_path.bottom
+                if tracing:
+                    reads.append((current_path, "top", top))
+                    reads.append((current_path, "bottom", bottom))
+                    for branch in (top, bottom):
+                        store = branch.store
+                        reads.append((branch, "store", store))
+                        if isinstance(store, TrailSeries):
+                            reads.append((store, "mountain", store.mountain))
+                            difficulties.append((store.mountain, store.mountain.difficulty_level))
+                choice = personality.select_branch(top, bottom)
                 if choice == PersonalityDecision.STOP:
                     return
                 elif choice == PersonalityDecision.BOTTOM:
-                    current_path = current_path.bottom.store
+                    current_path = bottom.store
                 elif choice == PersonalityDecision.TOP:
-                    current_path = current_path.top.store
-            
+                    current_path = top.store
+
             while current_path is None and len(stack_trailsplit) > 0:
-                current_path = stack_trailsplit.pop().following.store
+                split = stack_trailsplit.pop()
+                following = split.following
+                current_path = following.store
+                if tracing:
+                    reads.append((split, "following", following))
+                    reads.append((following, "store", current_path))
+
+    def follow_paths(self, personalities: Iterable[WalkerPersonality]) -> None:
+        """Follow a path for every personality at once, as follow_path would for each.
+
+        Walkers at the same node move together as a cohort, so each node is walked
+        once per cohort rather than once per walker. At a split the cohort divides by
+        decision, and the top and bottom cohorts merge again at the split's following trail.
+        Deterministic personalities skip the cohorts and replay their cached route.
+
+        :complexity:
+        Best Case Complexity: O(W), where W is the number of walkers, and they all stop at the first split.
+        Worst Case Complexity: O(N * W), where N is the number of trail nodes.
+        """
+        from personality import PersonalityDecision
+
+        stack_cohort = LinkedStack()
+        # Walkers that have finished a branch, waiting at the split's following trail.
+        arrivals: dict[int, list[WalkerPersonality]] = {}
+        walkers = []
+        for personality in personalities:
+            if personality.is_deterministic():
+                for mountain in self.route(personality):
+                    personality.add_mountain(mountain)
+            else:
+                walkers.append(personality)
+        stack_cohort.push((self.store, None, walkers, False))
+        while not stack_cohort.is_empty():
+            current_path, pending, walkers, is_join = stack_cohort.pop()
+            if is_join:
+                walkers = arrivals.pop(id(pending))
+                following, pending = pending
+                current_path = following.store
+
+            while len(walkers) > 0:
+                if current_path is None:
+                    if pending is not None:
+                        arrivals[id(pending)].extend(walkers)
+                    break
+                elif isinstance(current_path, TrailSeries):
+                    for walker in walkers:
+                        walker.add_mountain(current_path.mountain)
+                    current_path = current_path.following.store
+                elif isinstance(current_path, TrailSplit):
+                    top_walkers, bottom_walkers = [], []
+                    for walker in walkers:
+                        choice = walker.select_branch(current_path.top, current_path.bottom)
+                        if choice == PersonalityDecision.TOP:
+                            top_walkers.append(walker)
+                        elif choice == PersonalityDecision.BOTTOM:
+                            bottom_walkers.append(walker)
+                    # Pushed in reverse so the top cohort goes first, and both finish before the join.
+                    pending = (current_path.following, pending)
+                    arrivals[id(pending)] = []
+                    stack_cohort.push((None, pending, None, True))
+                    stack_cohort.push((current_path.bottom.store, pending, bottom_walkers, False))
+                    current_path = current_path.top.store
+                    walkers = top_walkers
 
     def collect_all_mountains(self) -> list[Mountain]:
-        """Returns a list of all mountains on the trail."""
+        """
+        Returns a list of all mountains on the trail.
+
+        :complexity: O(N), where N is the number of trail nodes.
+        """
+        return list(self.iter_mountains())
+
+    def iter_mountains(self) -> Iterator[Mountain]:
+        """
+        Yields every mountain on the trail, top branches before bottom branches
+        before the following trail.
+
+        Uses an explicit stack rather than recursion, so long series trails
+        do not hit the recursion limit.
+
+        :complexity: O(N), where N is the number of trail nodes.
+        """
+        stack_trail = LinkedStack()
+        stack_trail.push(self)
+        while not stack_trail.is_empty():
+            current_path = stack_trail.pop().store
+            if isinstance(current_path, TrailSeries):
+                yield current_path.mountain
+                stack_trail.push(current_path.following)
+            elif isinstance(current_path, TrailSplit):
+                # Pushed in reverse so top is explored first.
+                stack_trail.push(current_path.following)
+                stack_trail.push(current_path.bottom)
+                stack_trail.push(current_path.top)
+
+    def iter_paths(self) -> Iterator[list[Mountain]]:
+        """
+        Yields the mountains along every path through the trail, taking top
+        branches before bottom branches.
+
+        :complexity: O(P * N), where P is the number of paths and N is the number of trail nodes.
+        """
+        return self._iter_paths(lambda hardest, easiest: True)
+
+    def iter_difficulty_maximum_paths(self, max_difficulty: int) -> Iterator[list[Mountain]]:
+        """
+        Yields every path whose mountains all have difficulty at most max_difficulty.
+
+        :complexity: See iter_paths, but a path is abandoned at the first mountain that is too hard.
+        """
+        return self._iter_paths(lambda hardest, easiest: hardest <= max_difficulty)
+
+    def iter_difficulty_difference_paths(self, max_difference: int) -> Iterator[list[Mountain]]:
+        """
+        Yields every path whose hardest and easiest mountains differ in difficulty
+        by at most max_difference.
+
+        :complexity: See iter_paths, but a path is abandoned as soon as its spread is too large.
+        """
+        return self._iter_paths(lambda hardest, easiest: hardest - easiest <= max_difference)
+
+    def _iter_paths(self, within_bounds: Callable[[int, int], bool]) -> Iterator[list[Mountain]]:
+        """
+        Yields every path through the trail, pruning a path as soon as
+        within_bounds(hardest, easiest) fails for the difficulties walked so far.
+
+        Only the top branch of a split is walked straight away, the bottom branch is
+        pushed onto an explicit stack. The followings still to walk and the mountains
+        walked so far are kept as (head, rest) pairs, so branches share them instead of copying.
+
+        :complexity: O(P * N), where P is the number of paths explored and N is the number of trail nodes.
+        """
         stack_trailsplit = LinkedStack()
-       
-        mountain_list = []
-        if self.store is None:
-            return mountain_list
-        elif isinstance(self.store, TrailSeries):
-            mountain_list.append(self.store.mountain)
-            mountain_list = mountain_list + self.store.following.collect_all_mountains()
-        else:
-            top_branch = self.store.top.collect_all_mountains()
-            bot_branch = self.store.bottom.collect_all_mountains()
-            following = self.store.following.collect_all_mountains()
-            mountain_list = mountain_list + top_branch + bot_branch + following
-
-        return mountain_list
+        stack_trailsplit.push((self.store, None, None, None, None))
+        while not stack_trailsplit.is_empty():
+            current_path, pending, walked, hardest, easiest = stack_trailsplit.pop()
+            while True:
+                if current_path is None:
+                    if pending is None:
+                        yield self._unwind(walked)
+                        break
+                    following, pending = pending
+                    current_path = following.store
+                elif isinstance(current_path, TrailSeries):
+                    difficulty = current_path.mountain.difficulty_level
+                    hardest = difficulty if hardest is None else max(hardest, difficulty)
+                    easiest = difficulty if easiest is None else min(easiest, difficulty)
+                    if not within_bounds(hardest, easiest):
+                        break
+                    walked = (current_path.mountain, walked)
+                    current_path = current_path.following.store
+                elif isinstance(current_path, TrailSplit):
+                    pending = (current_path.following, pending)
+                    stack_trailsplit.push((current_path.bottom.store, pending, walked, hardest, easiest))
+                    current_path = current_path.top.store
+
+    @staticmethod
+    def _unwind(walked) -> list[Mountain]:
+        """
+        Returns the mountains in a (mountain, rest) chain, first walked first.
+
+        :complexity: O(N), where N is the length of the chain.
+        """
+        mountains = []
+        while walked is not None:
+            mountain, walked = walked
+            mountains.append(mountain)
+        mountains.reverse()
+        return mountains
+
+    def _fold(self, empty: T, series: Callable[[Mountain, T], T], split: Callable[[T, T, T], T]) -> T:
+        """
+        Combines a value for every path through the trail without enumerating the paths.
+
+        The empty trail is worth `empty`, a series is worth series(mountain, following)
+        and a split is worth split(top, bottom, following). Each node is combined once,
+        children before parents, using explicit stacks rather than recursion.
+
+        :complexity: O(N * C), where N is the number of trail nodes and C is the cost of a combine.
+        """
+        stack_trail = LinkedStack()
+        stack_value = LinkedStack()
+        stack_trail.push((self.store, False))
+        while not stack_trail.is_empty():
+            current_path, children_done = stack_trail.pop()
+            if current_path is None:
+                stack_value.push(empty)
+            elif children_done and isinstance(current_path, TrailSeries):
+                stack_value.push(series(current_path.mountain, stack_value.pop()))
+            elif children_done:
+                following = stack_value.pop()
+                bottom = stack_value.pop()
+                stack_value.push(split(stack_value.pop(), bottom, following))
+            elif isinstance(current_path, TrailSeries):
+                stack_trail.push((current_path, True))
+                stack_trail.push((current_path.following.store, False))
+            elif isinstance(current_path, TrailSplit):
+                # Pushed in reverse so the values come back top, bottom, following.
+                stack_trail.push((current_path, True))
+                stack_trail.push((current_path.following.store, False))
+                stack_trail.push((current_path.bottom.store, False))
+                stack_trail.push((current_path.top.store, False))
+        return stack_value.pop()
+
+    def count_paths(self) -> int:
+        """
+        Returns the number of distinct paths through the trail.
+
+        :complexity: O(N), where N is the number of trail nodes.
+        """
+        return self._fold(
+            1,
+            lambda mountain, following: following,
+            lambda top, bottom, following: (top + bottom) * following,
+        )
+
+    def count_difficulty_maximum_paths(self, max_difficulty: int) -> int:
+        """
+        Returns the number of paths whose mountains all have difficulty at most max_difficulty.
+
+        :complexity: O(N), where N is the number of trail nodes.
+        """
+        return self._fold(
+            1,
+            lambda mountain, following: following if mountain.difficulty_level <= max_difficulty else 0,
+            lambda top, bottom, following: (top + bottom) * following,
+        )
+
+    def min_path_length(self) -> int:
+        """
+        Returns the smallest total mountain length over all paths.
+
+        :complexity: O(N), where N is the number of trail nodes.
+        """
+        return self._fold(
+            0,
+            lambda mountain, following: mountain.length + following,
+            lambda top, bottom, following: min(top, bottom) + following,
+        )
+
+    def max_path_length(self) -> int:
+        """
+        Returns the largest total mountain length over all paths.
+
+        :complexity: O(N), where N is the number of trail nodes.
+        """
+        return self._fold(
+            0,
+            lambda mountain, following: mountain.length + following,
+            lambda top, bottom, following: max(top, bottom) + following,
+        )
+
+    def path_length_histogram(self) -> dict[int, int]:
+        """
+        Returns how many paths there are of each total mountain length.
+
+        :complexity: O(N * H^2), where N is the number of trail nodes and H is the
+                    number of distinct path lengths.
+        """
+        def series(mountain: Mountain, following: dict[int, int]) -> dict[int, int]:
+            return {mountain.length + length: count for length, count in following.items()}
+
+        def split(top: dict[int, int], bottom: dict[int, int], following: dict[int, int]) -> dict[int, int]:
+            branches = dict(top)
+            for length, count in bottom.items():
+                branches[length] = branches.get(length, 0) + count
+            histogram: dict[int, int] = {}
+            for branch_length, branch_count in branches.items():
+                for following_length, following_count in following.items():
+                    length = branch_length + following_length
+                    histogram[length] = histogram.get(length, 0) + branch_count * following_count
+            return histogram
+
+        return self._fold({0: 1}, series, split)
 
     def difficulty_maximum_paths(self, max_difficulty: int) -> list[list[Mountain]]: # Input to this should not exceed k > 50, at most 5 branches.
-        # 1008/2085 ONLY!
-        raise NotImplementedError()
+        """
+        Returns every path whose mountains all have difficulty at most max_difficulty.
+
+        :complexity: See iter_difficulty_maximum_paths.
+        """
+        return list(self.iter_difficulty_maximum_paths(max_difficulty))
 
     def difficulty_difference_paths(self, max_difference: int) -> list[list[Mountain]]: # Input to this should not exceed k > 50, at most 5 branches.
-        # 1054 ONLY!
-        raise NotImplementedError()
+        """
+        Returns every path whose hardest and easiest mountains differ in difficulty
+        by at most max_difference.
+
+        :complexity: See iter_difficulty_difference_paths.
+        """
+        return list(self.iter_difficulty_difference_paths(max_difference))
+
+
+class _Interned:
+    """
+    Makes a node immutable once interned, since it is shared by every trail it appears in.
+
+    An interner never builds two nodes with equal fields, so two interned nodes are
+    equal exactly when they are the same node (nodes from different interners never are).
+    An interned node compares equal to any other node of its base class with equal fields.
+    """
+    __slots__ = ()
+
+    # The class being interned, whose fields this node holds.
+    BASE: type
+
+    def __init__(self, *values) -> None:
+        for field, value in zip(fields(self.BASE), values):
+            object.__setattr__(self, field.name, value)
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError(f"{type(self).__name__} is shared and can't be changed, use TrailInterner.thaw to edit it")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{type(self).__name__} is shared and can't be changed, use TrailInterner.thaw to edit it")
+
+    def __eq__(self, other: object) -> bool:
+        if self is other:
+            return True
+        elif isinstance(other, _Interned):
+            return False
+        elif not isinstance(other, self.BASE):
+            return NotImplemented
+        # Tuples compare identical children without recursing into them.
+        names = [field.name for field in fields(self.BASE)]
+        return tuple(getattr(self, name) for name in names) == tuple(getattr(other, name) for name in names)
+
+class InternedMountain(_Interned, Mountain):
+    __slots__ = ()
+    BASE = Mountain
+
+class InternedTrail(_Interned, Trail):
+    __slots__ = ()
+    BASE = Trail
+
+class InternedSeries(_Interned, TrailSeries):
+    __slots__ = ()
+    BASE = TrailSeries
+
+class InternedSplit(_Interned, TrailSplit):
+    __slots__ = ()
+    BASE = TrailSplit
+
+class TrailInterner:
+    """
+    Hash-conses trails, so identical subtrails are stored once.
+
+    Nodes are looked up by their kind and the identity of their (already interned)
+    children, and mountains by their fields. Two interned trails are then equal
+    exactly when they are the same object.
+
+    Interned nodes and mountains are shared, so they are immutable. The add_*/remove_*
+    methods still work, as they return new nodes rather than editing in place, but
+    anything that edits in place, like the editor, needs a copy made by thaw.
+
+    Unless stated otherwise, all methods have O(1) complexity.
+    """
+
+    def __init__(self) -> None:
+        self.nodes: dict[tuple, Trail] = {}
+        self.mountains: dict[tuple[str, int, int], Mountain] = {}
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def mountain(self, name: str, difficulty_level: int, length: int) -> Mountain:
+        """Returns the shared mountain with these fields."""
+        key = (name, difficulty_level, length)
+        if key not in self.mountains:
+            self.mountains[key] = InternedMountain(name, difficulty_level, length)
+        return self.mountains[key]
+
+    def empty(self) -> Trail:
+        """Returns the shared empty trail."""
+        return self._node(("empty",), lambda: None)
+
+    def series(self, mountain: Mountain, following: Trail) -> Trail:
+        """Returns the shared trail of mountain followed by an interned following trail."""
+        mountain = self.mountain(mountain.name, mountain.difficulty_level, mountain.length)
+        return self._node(("series", id(mountain), id(following)), lambda: InternedSeries(mountain, following))
+
+    def split(self, top: Trail, bottom: Trail, following: Trail) -> Trail:
+        """Returns the shared trail splitting into interned top and bottom trails, then an interned following trail."""
+        return self._node(("split", id(top), id(bottom), id(following)), lambda: InternedSplit(top, bottom, following))
+
+    def _node(self, key: tuple, make_store: Callable[[], TrailStore]) -> Trail:
+        # Children are kept alive by the nodes dictionary, so their ids are never reused.
+        if key not in self.nodes:
+            self.nodes[key] = InternedTrail(make_store())
+        return self.nodes[key]
+
+    def intern(self, trail: Trail) -> Trail:
+        """
+        Returns the interned copy of a trail.
+
+        :complexity: O(N), where N is the number of trail nodes.
+        """
+        return trail._fold(self.empty(), self.series, self.split)
+
+    @staticmethod
+    def thaw(trail: Trail) -> Trail:
+        """
+        Returns an editable copy of a trail, with its own nodes and mountains
+        wherever the trail shares interned ones.
+
+        :complexity: O(N), where N is the number of trail nodes, counting shared ones each time they appear.
+        """
+        # Empty trails are None until they are used, so each gets its own Trail.
+        def fresh(trail: Trail | None) -> Trail:
+            return Trail(None) if trail is None else trail
+
+        return fresh(trail._fold(
+            None,
+            lambda mountain, following: Trail(TrailSeries(
+                Mountain(mountain.name, mountain.difficulty_level, mountain.length), fresh(following)
+            )),
+            lambda top, bottom, following: Trail(TrailSplit(fresh(top), fresh(bottom), fresh(following))),
+        ))
@@ -1,12 +1,70 @@
+from __future__ import annotations
+from math import comb
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+Point = tuple[float, float]
+
+# Sampled curves are dropped once the cache grows past this.
+POLYLINE_CACHE_LIMIT = 1 << 12
+
+_polylines: dict[tuple[tuple[Point, ...], int], tuple[Point, ...]] = {}
+
 def av(*args):
     return sum(args)/len(args)
 
+def _de_casteljau(points: tuple[Point, ...], t: float) -> Point:
+    """
+    Evaluates a Bézier curve at t by repeatedly interpolating between neighbouring points.
+
+    :complexity: O(D^2), where D is the number of control points.
+    """
+    xs = [x for x, _ in points]
+    ys = [y for _, y in points]
+    for n in range(len(points) - 1, 0, -1):
+        for i in range(n):
+            xs[i] = (1-t) * xs[i] + t * xs[i+1]
+            ys[i] = (1-t) * ys[i] + t * ys[i+1]
+    return xs[0], ys[0]
+
 def bezier(*points):
-    if len(points) == 1:
-        return lambda t: points[0]
-    p1 = bezier(*points[:-1])
-    p2 = bezier(*points[1:])
-    return lambda t: (
-        (1-t) * p1(t)[0] + t * p2(t)[0],
-        (1-t) * p1(t)[1] + t * p2(t)[1]
-    )
+    """Returns the Bézier curve through these control points, as a function of t in [0, 1]."""
+    return lambda t: _de_casteljau(points, t)
+
+def bezier_polyline(points: tuple[Point, ...], samples: int = 101) -> tuple[Point, ...]:
+    """
+    Returns the Bézier curve with these control points sampled at `samples` evenly spaced t from 0 to 1.
+
+    With NumPy every sample is one product with the Bernstein basis. Results are cached
+    per control points, so redrawing the same curve costs a lookup.
+
+    :raises ValueError: when samples is less than 2, as both ends of the curve are sampled.
+    :complexity: O(S * D^2) the first time, where S is the number of samples and D the number
+                of control points. O(1) afterwards.
+    """
+    if samples < 2:
+        raise ValueError(f"bezier_polyline needs at least 2 samples, got {samples}")
+    points = tuple((float(x), float(y)) for x, y in points)
+    cache_key = (points, samples)
+    polyline = _polylines.get(cache_key)
+    if polyline is not None:
+        return polyline
+
+    ts = [i / (samples - 1) for i in range(samples)]
+    if np is None:
+        polyline = tuple(_de_casteljau(points, t) for t in ts)
+    else:
+        degree = len(points) - 1
+        t = np.array(ts)[:, None]
+        k = np.arange(degree + 1)
+        coefficients = np.array([comb(degree, i) for i in range(degree + 1)], dtype=float)
+        basis = coefficients * t ** k * (1 - t) ** (degree - k)
+        polyline = tuple(map(tuple, (basis @ np.array(points)).tolist()))
+
+    if len(_polylines) > POLYLINE_CACHE_LIMIT:
+        _polylines.clear()
+    _polylines[cache_key] = polyline
+    return polyline